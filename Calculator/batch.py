@@ -0,0 +1,202 @@
+# batch.py
+# Headless batch mode: evaluates a file of expressions, one per line.
+#   python -m batch expressions.txt --format csv -o results.csv
+#   generate | python -m batch --mode left2right --format jsonl
+# Lines flow through a generator pipeline (read -> evaluate -> format ->
+# buffered write), so memory stays flat however large the input is.
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+
+import cache
+import engine
+import instrument
+import numeric
+import optimize
+
+ERRORS = (ValueError, ZeroDivisionError, KeyError, ArithmeticError)
+
+
+def _left2right(expr, backend=None):
+    return engine.run_left2right(engine.compile_left2right(expr, backend), backend)
+
+
+EVALUATORS = {'parens': engine.evaluate, 'left2right': _left2right,
+              'folded': optimize.evaluate, 'deep': engine.evaluate_deep}
+CACHE_KINDS = {'parens': 'engine', 'left2right': 'left2right', 'folded': 'folded',
+               'deep': 'engine'}
+
+
+def get_evaluator(mode='parens', use_cache=False, backend=None):
+    # backend is a numeric.Backend or None for float
+    if use_cache:
+        kind = CACHE_KINDS[mode]
+        return lambda expr: cache.shared.evaluate(expr, kind, backend)
+    if backend is not None:
+        fn = EVALUATORS[mode]
+        return lambda expr: fn(expr, backend)
+    return EVALUATORS[mode]
+
+
+def read_expressions(stream):
+    for lineno, line in enumerate(stream, 1):
+        expr = line.strip()
+        if expr and not expr.startswith('#'):
+            yield lineno, expr
+
+
+def evaluate_stream(items, evaluate):
+    # yields (lineno, expr, value, error); exactly one of value/error is None
+    for lineno, expr in items:
+        try:
+            yield lineno, expr, evaluate(expr), None
+        except ERRORS as e:
+            yield lineno, expr, None, str(e) or type(e).__name__
+
+
+def format_plain(records):
+    for lineno, expr, value, error in records:
+        yield f'{value}\n' if error is None else f'error: line {lineno}: {error}\n'
+
+
+def format_csv(records):
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    writer.writerow(('line', 'expression', 'result', 'error'))
+    for lineno, expr, value, error in records:
+        writer.writerow((lineno, expr, '' if value is None else value, error or ''))
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+
+
+def format_jsonl(records):
+    dumps = json.dumps
+    for lineno, expr, value, error in records:
+        row = {'line': lineno, 'expression': expr}
+        if error is None:
+            row['result'] = value if value.__class__ in (float, int) else str(value)
+        else:
+            row['error'] = error
+        yield dumps(row) + '\n'
+
+
+FORMATS = {'plain': format_plain, 'csv': format_csv, 'jsonl': format_jsonl}
+
+
+def write_buffered(chunks, out, buffer_lines=1024):
+    pending = []
+    for chunk in chunks:
+        pending.append(chunk)
+        if len(pending) >= buffer_lines:
+            out.write(''.join(pending))
+            pending.clear()
+    if pending:
+        out.write(''.join(pending))
+    out.flush()
+
+
+def watch_errors(records, counts, on_error):
+    for record in records:
+        if record[3] is not None:
+            counts['errors'] += 1
+            if on_error == 'stop':
+                yield record
+                return
+            if on_error == 'skip':
+                continue
+        yield record
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(prog='python -m batch',
+                                description='Evaluate calculator expressions line by line.')
+    p.add_argument('input', nargs='?', default='-', help="input file, '-' for stdin")
+    p.add_argument('-o', '--output', default='-', help="output file, '-' for stdout")
+    p.add_argument('-m', '--mode', choices=sorted(EVALUATORS), default='parens',
+                   help='parens: evaluate_with_parentheses, left2right: INFIX left2right, '
+                        'folded: parens with repeated groups evaluated once, '
+                        'deep: parens streamed, for very deep nesting')
+    p.add_argument('-f', '--format', choices=sorted(FORMATS), default='plain')
+    p.add_argument('-b', '--buffer', type=int, default=1024,
+                   help='lines collected before each write (1 = unbuffered)')
+    p.add_argument('--errors', choices=('report', 'skip', 'stop'), default='report',
+                   help='report errors in the output, skip them, or stop at the first')
+    p.add_argument('--backend', choices=sorted(numeric.BACKENDS), default='float',
+                   help='numeric backend (see numeric.py)')
+    p.add_argument('--precision', type=int, default=None,
+                   help='significant digits; only with --backend decimal')
+    p.add_argument('--cache', action='store_true',
+                   help='go through the shared expression cache')
+    p.add_argument('-j', '--workers', type=int, default=1,
+                   help='worker processes (0 = one per CPU)')
+    p.add_argument('--chunk-size', type=int, default=2000,
+                   help='expressions sent to a worker at a time')
+    p.add_argument('--stats', action='store_true',
+                   help='print per-worker throughput to stderr')
+    p.add_argument('--timings', action='store_true',
+                   help='print per-stage timers to stderr (also CALC_STATS=1); '
+                        'covers this process only')
+    p.add_argument('--profile', metavar='PATH', default=instrument.profile_path(),
+                   help='write a cProfile dump of the run (also CALC_PROFILE=PATH)')
+    args = p.parse_args(argv)
+    if args.precision is not None and args.backend != 'decimal':
+        p.error('--precision needs --backend decimal')
+    if args.workers < 0:
+        p.error('--workers must be 0 (one per CPU) or more')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    src = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    counts = {'errors': 0}
+    backend = None
+    if args.backend != 'float':
+        backend = numeric.get_backend(args.backend, args.precision)
+    stats = {}
+    if args.timings:
+        instrument.enable()
+    t0 = time.perf_counter()
+    try:
+        if args.workers == 1:
+            records = evaluate_stream(read_expressions(src),
+                                      get_evaluator(args.mode, args.cache, backend))
+        else:
+            import parallel
+            records = parallel.evaluate_parallel(read_expressions(src), args.mode,
+                                                 args.workers or None,
+                                                 max(1, args.chunk_size), stats,
+                                                 backend=(args.backend, args.precision))
+        records = watch_errors(records, counts, args.errors)
+        with instrument.profiled(args.profile):
+            write_buffered(FORMATS[args.format](records), out, max(1, args.buffer))
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+    if args.stats:
+        wall = time.perf_counter() - t0
+        if stats:
+            import parallel
+            lines = parallel.format_stats(stats, wall)
+        else:
+            lines = [f'evaluated in {wall:.3f}s in one process']
+        for line in lines:
+            print(line, file=sys.stderr)
+    if instrument.probe.on:
+        for line in instrument.format_stats():
+            print(line, file=sys.stderr)
+    if counts['errors']:
+        print(f'{counts["errors"]} line(s) failed', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+# bench_deep.py
+# Stress test for very deep nesting: time and peak traced memory of
+# engine.evaluate (token list, tuple frames) and engine.evaluate_deep
+# (streamed tokens, packed frames) up to a million levels, checked against
+# the known result. The splice evaluator only runs at the small depths.
+#   python bench_deep.py [--max-depth 1000000] [--max-legacy 2000]
+import argparse
+import sys
+import time
+import tracemalloc
+
+import engine
+from bench_engine import nested, splice_evaluate
+
+
+def measure(fn, expr):
+    t0 = time.perf_counter()
+    value = fn(expr)
+    wall = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(expr)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return value, wall, peak
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument('--max-depth', type=int, default=10 ** 6)
+    p.add_argument('--max-legacy', type=int, default=2000,
+                   help='deepest input the splice evaluator is run on')
+    args = p.parse_args(argv)
+
+    fns = [('evaluate', engine.evaluate), ('evaluate_deep', engine.evaluate_deep)]
+    print(f'recursion limit {sys.getrecursionlimit()}')
+    print(f'{"depth":>9}{"chars":>10}{"function":>15}{"seconds":>10}{"peak MB":>10}{"B/level":>9}')
+    depth = 1000
+    while depth <= args.max_depth:
+        expr = nested(depth)
+        if depth <= args.max_legacy:
+            assert splice_evaluate(expr) == depth + 1
+        for name, fn in fns:
+            value, wall, peak = measure(fn, expr)
+            assert value == depth + 1, (name, depth, value)
+            print(f'{depth:>9}{len(expr):>10}{name:>15}{wall:>10.3f}'
+                  f'{peak / 2 ** 20:>10.2f}{peak / depth:>9.1f}')
+        depth *= 10
+
+
+if __name__ == '__main__':
+    main()
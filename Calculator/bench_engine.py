@@ -0,0 +1,163 @@
+# bench_engine.py
+# Scaling of the single-pass engine against the old splice-and-rescan
+# evaluate_with_parentheses, over expression length and nesting depth.
+# --check N instead evaluates N random expressions with the old evaluator,
+# the engine (run and run_deep) and the folding pass, and exits with
+# status 1 if any result differs in a single bit.
+#   python bench_engine.py [--max-legacy N] [--repeat R]
+#   python bench_engine.py --check 20000
+import argparse
+import operator
+import random
+import re
+import sys
+import time
+
+import engine
+import optimize
+
+OPS = {'+': operator.add, '-': operator.sub,
+       '*': operator.mul, '/': operator.truediv}
+
+
+def left2right(expr: str) -> float:
+    # the original regex left2right, kept as the reference
+    toks = re.findall(r'\d+\.\d+|\d+|[+\-*/]', expr)
+    if not toks:
+        raise ValueError
+    res = float(toks[0])
+    for op, num in zip(toks[1::2], toks[2::2]):
+        res = OPS[op](res, float(num))
+    return res
+
+
+def splice_evaluate(expr: str, text=str) -> float:
+    # the previous evaluate_with_parentheses, kept as the reference; text
+    # turns a group's value back into source
+    expr = expr.replace(' ', '')
+    while '(' in expr:
+        start = -1
+        for i, char in enumerate(expr):
+            if char == '(':
+                start = i
+            elif char == ')':
+                if start == -1:
+                    raise ValueError("Unmatched parentheses")
+                inner_expr = expr[start+1:i]
+                if not inner_expr:
+                    raise ValueError("Empty parentheses")
+                result = left2right(inner_expr)
+                expr = expr[:start] + text(result) + expr[i+1:]
+                break
+        else:
+            if start != -1:
+                raise ValueError("Unmatched parentheses")
+    return left2right(expr)
+
+
+def flat_groups(n: int) -> str:
+    return '1' + '+(2*3-1)' * n
+
+
+def nested(depth: int) -> str:
+    return '(' * depth + '1' + '+1)' * depth
+
+
+def random_expression(rng, depth=0):
+    # positive literals only; a negative group value still trips the old
+    # evaluator, and such inputs are skipped
+    parts = []
+    for i in range(rng.randint(1, 5)):
+        if i:
+            parts.append(rng.choice('+-*/'))
+        if depth < 4 and rng.random() < 0.3:
+            # repeat an earlier group now and then, for the folding pass
+            group = rng.choice(parts[::2]) if parts and rng.random() < 0.3 else None
+            if group is None or not group.startswith('('):
+                group = f'({random_expression(rng, depth + 1)})'
+            parts.append(group)
+        else:
+            parts.append(rng.choice([str(rng.randint(0, 99)),
+                                     f'{rng.randint(0, 99)}.{rng.randint(0, 99)}']))
+    return ''.join(parts)
+
+
+def _plain(value):
+    # the old evaluator's regex reads 1e-05 as 1 - 05, so a group whose
+    # value prints with an exponent is rejected rather than misread
+    text = str(value)
+    if 'e' in text or 'n' in text:
+        raise ValueError(text)
+    return text
+
+
+def _outcome(fn, expr):
+    try:
+        return repr(fn(expr))
+    except (ValueError, ArithmeticError) as e:
+        return type(e).__name__
+
+
+def check(count, seed=2024):
+    rng = random.Random(seed)
+    evaluators = [('engine', engine.evaluate), ('deep', engine.evaluate_deep),
+                  ('folded', optimize.evaluate)]
+    compared = skipped = 0
+    mismatches = []
+    for _ in range(count):
+        expr = random_expression(rng)
+        try:
+            old = repr(splice_evaluate(expr, _plain))
+        except (ValueError, ArithmeticError):
+            skipped += 1
+            continue
+        compared += 1
+        for name, fn in evaluators:
+            new = _outcome(fn, expr)
+            if new != old:
+                mismatches.append((name, expr, old, new))
+    print(f'{compared} expression(s) compared, {skipped} rejected by the old evaluator, '
+          f'{len(mismatches)} mismatch(es)')
+    for name, expr, old, new in mismatches[:20]:
+        print(f'  {name}: {expr} -> {new}, old {old}')
+    return 1 if mismatches else 0
+
+
+def best_time(fn, expr, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(expr)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument('--max-legacy', type=int, default=4000,
+                   help='largest size the splice evaluator is run at')
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--check', type=int, metavar='N',
+                   help='compare N random expressions against the old evaluator instead')
+    args = p.parse_args(argv)
+    if args.check is not None:
+        return check(args.check)
+
+    cases = [('groups', flat_groups, [10, 100, 1000, 4000, 20000, 200000]),
+             ('depth', nested, [10, 100, 1000, 4000, 20000, 200000])]
+    print(f'{"shape":<8}{"size":>8}{"chars":>10}{"splice (s)":>14}{"engine (s)":>14}{"speedup":>10}')
+    for shape, build, sizes in cases:
+        for n in sizes:
+            expr = build(n)
+            fast = best_time(engine.evaluate, expr, args.repeat)
+            if n <= args.max_legacy:
+                assert splice_evaluate(expr) == engine.evaluate(expr)
+                slow = best_time(splice_evaluate, expr, 1)
+                cols = f'{slow:>14.6f}{fast:>14.6f}{slow / fast:>9.1f}x'
+            else:
+                cols = f'{"-":>14}{fast:>14.6f}{"-":>10}'
+            print(f'{shape:<8}{n:>8}{len(expr):>10}{cols}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
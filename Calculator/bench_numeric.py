@@ -0,0 +1,55 @@
+# bench_numeric.py
+# Throughput of each numeric backend on the parentheses engine, left2right
+# and the RPN machine, to pick the cheapest exact mode for a workload.
+#   python bench_numeric.py [--count N] [--precision P]
+import argparse
+import random
+import time
+
+import engine
+import numeric
+import rpn
+
+
+def make_workload(count, seed=9020):
+    rng = random.Random(seed)
+    exprs, programs = [], []
+    for _ in range(count):
+        nums = [str(rng.randint(1, 9999)) for _ in range(8)]
+        ops = [rng.choice('+-*') for _ in range(7)]
+        exprs.append(nums[0] + ''.join(f'{o}({a}+{b})' if i % 3 == 0 else f'{o}{a}'
+                                       for i, (o, a, b) in enumerate(zip(ops, nums[1:], nums[:-1]))))
+        program = [nums[0]]
+        for o, a in zip(ops, nums[1:]):
+            program += [a, o]
+        programs.append(program)
+    return exprs, programs
+
+
+def timed(fn, items):
+    t0 = time.perf_counter()
+    for item in items:
+        fn(item)
+    return len(items) / (time.perf_counter() - t0)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument('--count', type=int, default=20000)
+    p.add_argument('--precision', type=int, default=28, help='decimal precision')
+    args = p.parse_args(argv)
+
+    exprs, programs = make_workload(args.count)
+    backends = [numeric.FLOAT, numeric.INT, numeric.FRACTION,
+                numeric.get_backend('decimal', args.precision)]
+    print(f'{args.count} expressions, expressions/s')
+    print(f'{"backend":<14}{"parens":>12}{"left2right":>12}{"rpn":>12}')
+    for b in backends:
+        parens = timed(lambda e: engine.evaluate(e, b), exprs)
+        l2r = timed(lambda e: engine.run_left2right(engine.compile_left2right(e, b), b), exprs)
+        r = timed(lambda prog: rpn.RPNMachine(backend=b).run(prog), programs)
+        print(f'{b.name:<14}{parens:>12,.0f}{l2r:>12,.0f}{r:>12,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# bench_parallel.py
+# Throughput of parallel.evaluate_parallel from 1 to N worker processes.
+#   python bench_parallel.py [--count N] [--workers 1,2,4,8] [--chunk-size C]
+import argparse
+import os
+import random
+import time
+
+import parallel
+
+
+def make_expressions(count, seed=9020):
+    rng = random.Random(seed)
+    ops = '+-*/'
+    for lineno in range(1, count + 1):
+        parts = [str(rng.randint(1, 99))]
+        for _ in range(rng.randint(4, 12)):
+            parts.append(rng.choice(ops))
+            if rng.random() < 0.3:
+                parts.append(f'({rng.randint(1, 99)}{rng.choice(ops)}{rng.randint(1, 99)})')
+            else:
+                parts.append(str(rng.randint(1, 99)))
+        yield lineno, ''.join(parts)
+
+
+def main(argv=None):
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, 8, cpus} & set(range(1, cpus + 1)))
+    p = argparse.ArgumentParser()
+    p.add_argument('--count', type=int, default=400000)
+    p.add_argument('--workers', default=','.join(map(str, default_workers)))
+    p.add_argument('--chunk-size', type=int, default=2000)
+    args = p.parse_args(argv)
+
+    exprs = list(make_expressions(args.count))
+    print(f'{args.count} expressions, chunk size {args.chunk_size}, {cpus} CPUs')
+    print(f'{"workers":>8}{"seconds":>10}{"expr/s":>14}{"speedup":>10}{"efficiency":>12}')
+    base = None
+    for workers in map(int, args.workers.split(',')):
+        t0 = time.perf_counter()
+        n = sum(1 for _ in parallel.evaluate_parallel(exprs, workers=workers,
+                                                      chunk_size=args.chunk_size))
+        wall = time.perf_counter() - t0
+        assert n == args.count
+        base = base or wall
+        speedup = base / wall
+        print(f'{workers:>8}{wall:>10.3f}{n / wall:>14,.0f}{speedup:>9.2f}x{speedup / workers:>11.0%}')
+
+
+if __name__ == '__main__':
+    main()
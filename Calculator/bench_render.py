@@ -0,0 +1,59 @@
+# bench_render.py
+# Input-to-paint cost of a burst of key presses (paste, auto-repeat,
+# scripted entry) with synchronous rendering versus coalesced after_idle
+# rendering. Needs a display.
+#   python bench_render.py [--mode infix] [--keys 2000] [--bursts 20]
+import argparse
+import time
+import tkinter as tk
+
+import keytrace
+from loader import load_script
+
+
+def make_app(mode, coalesce):
+    module = load_script(mode)
+    if mode == 'parens':
+        app = module.Calculator(tk.Tk(), coalesce=coalesce)
+        return app, app.root, app.on_button_click
+    app = module.App(coalesce=coalesce)
+    return app, app.root, app.on_click
+
+
+def run(mode, coalesce, keys, bursts):
+    app, root, click = make_app(mode, coalesce)
+    root.update()
+    times = []
+    for _ in range(bursts):
+        t0 = time.perf_counter()
+        for k in keys:
+            try:
+                click(k)
+            except (ValueError, ZeroDivisionError):
+                pass
+        root.update_idletasks()
+        times.append(time.perf_counter() - t0)
+    stats = app.renderer.stats()
+    root.destroy()
+    times.sort()
+    return times[len(times) // 2], stats
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument('--mode', choices=sorted(keytrace.STATES), default='infix')
+    p.add_argument('--keys', type=int, default=2000)
+    p.add_argument('--bursts', type=int, default=20)
+    args = p.parse_args(argv)
+
+    keys = keytrace.synthesize(args.mode, args.keys).keys()
+    print(f'{args.mode}: {args.bursts} bursts of {len(keys)} keys')
+    print(f'{"rendering":<12}{"burst ms":>10}{"us/key":>9}{"paints/burst":>14}')
+    for coalesce in (False, True):
+        median, stats = run(args.mode, coalesce, keys, args.bursts)
+        print(f'{"coalesced" if coalesce else "immediate":<12}{median * 1e3:>10.2f}'
+              f'{median / len(keys) * 1e6:>9.2f}{stats["paints"] / args.bursts:>14.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# bench_server.py
+# Load generator for server.py: many concurrent connections, each keeping
+# a window of requests in flight. Starts its own server unless pointed at
+# one with --port/--unix.
+#   python bench_server.py [--clients 50] [--requests 2000] [--pipeline 16]
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from bench_parallel import make_expressions
+
+
+async def run_client(open_conn, exprs, pipeline, mode, latencies):
+    reader, writer = await open_conn()
+    sent = {}
+    window = asyncio.Semaphore(pipeline)
+    errors = 0
+
+    async def receive():
+        nonlocal errors
+        for _ in exprs:
+            reply = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - sent.pop(reply['id']))
+            errors += 'error' in reply
+            window.release()
+
+    receiver = asyncio.ensure_future(receive())
+    for i, expr in enumerate(exprs):
+        await window.acquire()
+        sent[i] = time.perf_counter()
+        writer.write((json.dumps({'id': i, 'expr': expr, 'mode': mode}) + '\n').encode())
+        await writer.drain()
+    await receiver
+    writer.close()
+    return errors
+
+
+async def load(args, open_conn):
+    exprs = [e for _, e in make_expressions(args.requests)]
+    latencies = []
+    t0 = time.perf_counter()
+    errors = await asyncio.gather(*[run_client(open_conn, exprs, args.pipeline,
+                                               args.mode, latencies)
+                                    for _ in range(args.clients)])
+    wall = time.perf_counter() - t0
+    reader, writer = await open_conn()
+    writer.write(b'{"op": "stats"}\n')
+    stats = json.loads(await reader.readline())['stats']
+    writer.close()
+    lat = sorted(latencies)
+    total = len(lat)
+    print(f'{args.clients} clients x {args.requests} requests, pipeline {args.pipeline}, '
+          f'mode {args.mode}')
+    print(f'{total} replies in {wall:.3f}s = {total / wall:,.0f} req/s, '
+          f'{sum(errors)} errors')
+    print('client latency ms: ' + '  '.join(
+        f'p{q}={lat[min(total - 1, total * q // 100)] * 1e3:.2f}' for q in (50, 95, 99)))
+    print(f"server: {stats['batches']} batches, mean {stats['mean_batch']}, "
+          f"largest {stats['largest_batch']}, p99 queue-to-reply {stats['p99_ms']} ms")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument('--clients', type=int, default=50)
+    p.add_argument('--requests', type=int, default=2000, help='per client')
+    p.add_argument('--pipeline', type=int, default=16, help='requests in flight per client')
+    p.add_argument('-m', '--mode', default='parens')
+    p.add_argument('--port', type=int, default=None, help='use a running server')
+    p.add_argument('--unix', default=None, help='use a running server')
+    args = p.parse_args(argv)
+
+    proc = None
+    port = args.port
+    if args.port is None and args.unix is None:
+        here = os.path.dirname(os.path.abspath(__file__))
+        proc = subprocess.Popen([sys.executable, os.path.join(here, 'server.py'), '--port', '0'],
+                                stdout=subprocess.PIPE, text=True)
+        port = int(proc.stdout.readline().rsplit(':', 1)[1])
+    limit = 2 ** 20
+    if args.unix is not None:
+        open_conn = lambda: asyncio.open_unix_connection(args.unix, limit=limit)
+    else:
+        open_conn = lambda: asyncio.open_connection('127.0.0.1', port, limit=limit)
+    try:
+        asyncio.run(load(args, open_conn))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
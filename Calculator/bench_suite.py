@@ -0,0 +1,210 @@
+# bench_suite.py
+# Throughput/latency benchmarks for every evaluation path, with JSON
+# baselines and a regression gate.
+#   python bench_suite.py --save bench_baseline.json
+#   python bench_suite.py --compare bench_baseline.json --threshold 15
+# --compare exits with status 1 when a case is slower than its baseline by
+# more than the threshold (percent of time per call), or when a baseline
+# case did not run. A case returns the callable to time, or
+# (callable, teardown) when it holds resources.
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import cache
+import engine
+import rpn
+from bench_engine import flat_groups, nested
+from loader import load_script
+
+CASES = {}
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+FLAT = '12.5+3*4-7/2+8*1.5-6+9/3*2-1'
+
+
+def _uncached(expr, kind='engine'):
+    # what a cache miss costs: compile and run, without touching
+    # cache.shared, whose size would otherwise show up in the timing
+    compile_, run = cache.COMPILERS[kind]
+    return lambda: run(compile_(expr, None), None)
+
+
+@case('left2right/uncached')
+def _():
+    return _uncached(FLAT, 'left2right')
+
+
+def _parens(expr):
+    return _uncached(expr)
+
+
+for _n in (10, 100, 1000, 10000):
+    case(f'parens/length/{_n}')(lambda n=_n: _parens(flat_groups(n)))
+    case(f'parens/depth/{_n}')(lambda n=_n: _parens(nested(n)))
+
+
+def redundant(n):
+    return '1' + '+(1.07*3+2.5/7-1.25*4+0.5*(3.3-1.1))' * n
+
+
+@case('parens/redundant')
+def _():
+    return _parens(redundant(1000))
+
+
+@case('folded/redundant')
+def _():
+    import optimize
+    expr = redundant(1000)
+    return lambda: optimize.evaluate(expr)
+
+
+@case('parens/cached')
+def _():
+    evaluate = load_script('parens').evaluate_with_parentheses
+    expr = flat_groups(100)
+    evaluate(expr)
+    return lambda: evaluate(expr)
+
+
+@case('rpn/program')
+def _():
+    program = ('3 4 + 2 * ' * 1000).split()
+    return lambda: rpn.RPNMachine().run(program)
+
+
+@case('rpn/push-apply')
+def _():
+    vm = rpn.RPNMachine()
+    push, apply = vm.push, vm.apply
+
+    def call():
+        push(3.0)
+        push(4.0)
+        apply('+')
+        vm.clear()
+    return call
+
+
+@case('infix/app-chain')
+def _():
+    # the chained-operator branch of INFIX_mode.App.on_click; needs a display
+    app = load_script('infix').App()
+    app.root.withdraw()
+    keys = ['1', '2', '+', '3', '*', '4', '-', '5', '/', '6', '=']
+
+    def call():
+        for k in keys:
+            app.on_click(k)
+        app.on_click('C')
+    return call, app.root.destroy
+
+
+def measure(fn, repeat=5, target=0.05):
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= target or number >= 1 << 24:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(target / elapsed) + 1))
+    times = [elapsed / number]
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - t0) / number)
+    best = min(times)
+    return {'number': number, 'best': best, 'median': statistics.median(times),
+            'ops_per_sec': 1.0 / best if best else float('inf')}
+
+
+def run_cases(names, repeat):
+    results = {}
+    for name in names:
+        try:
+            fn = CASES[name]()
+        except Exception as e:
+            print(f'{name:<24} skipped ({type(e).__name__}: {e})')
+            continue
+        teardown = None
+        if isinstance(fn, tuple):
+            fn, teardown = fn
+        try:
+            r = measure(fn, repeat)
+        finally:
+            if teardown is not None:
+                teardown()
+        results[name] = r
+        print(f'{name:<24}{r["best"] * 1e6:>12.2f} us{r["ops_per_sec"]:>14,.0f} /s')
+    return results
+
+
+def compare(results, baseline, threshold):
+    # a baseline case that did not run (skipped, renamed or removed) fails
+    # too, so a broken case cannot pass the gate unnoticed
+    failed = []
+    for name in baseline:
+        if name not in results:
+            print(f'{name:<24}{"":>10}  MISSING')
+            failed.append(name)
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        change = (r['best'] / base['best'] - 1) * 100
+        flag = 'REGRESSED' if change > threshold else 'ok'
+        print(f'{name:<24}{change:>+9.1f}%  {flag}')
+        if change > threshold:
+            failed.append(name)
+    return failed
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument('-k', '--filter', default='', help='only cases containing this text')
+    p.add_argument('--repeat', type=int, default=5)
+    p.add_argument('--save', metavar='FILE', help='write results as a JSON baseline')
+    p.add_argument('--compare', metavar='FILE', help='compare against a JSON baseline')
+    p.add_argument('--threshold', type=float,
+                   default=float(os.environ.get('BENCH_THRESHOLD', 10)),
+                   help='allowed slowdown in percent (default 10, or $BENCH_THRESHOLD)')
+    args = p.parse_args(argv)
+
+    names = [n for n in CASES if args.filter in n]
+    results = run_cases(names, args.repeat)
+    if args.save:
+        data = {'meta': {'python': platform.python_version(),
+                         'machine': platform.machine(),
+                         'time': time.strftime('%Y-%m-%d %H:%M:%S')},
+                'results': results}
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = {name: r for name, r in json.load(f)['results'].items()
+                        if args.filter in name}
+        failed = compare(results, baseline, args.threshold)
+        if failed:
+            print(f'{len(failed)} case(s) regressed more than {args.threshold:g}% '
+                  'or are missing: ' + ', '.join(failed))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
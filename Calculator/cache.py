@@ -0,0 +1,121 @@
+# cache.py
+# Bounded LRU cache of compiled expressions, shared by the calculators.
+# Entries are keyed on the expression with whitespace runs collapsed and
+# hold the compiled program and, optionally, its result. Expressions longer
+# than max_length are evaluated directly and never stored, so one huge
+# input neither fills the cache nor is held as a token list.
+import threading
+from collections import OrderedDict
+
+import engine
+import optimize
+
+# kind -> (compile, run)
+COMPILERS = {
+    'engine': (engine.tokenize, engine.run),
+    'left2right': (engine.compile_left2right, engine.run_left2right),
+    'folded': (lambda expr, backend: optimize.fold(expr, backend)[0], engine.run),
+}
+
+# kind -> evaluate(expr, backend) for expressions over max_length; folding
+# holds the tokens of every open group, so long folded input goes to the
+# streaming engine instead
+DIRECT = {
+    'engine': engine.evaluate_deep,
+    'left2right': lambda expr, backend: engine.run_left2right(
+        engine.compile_left2right(expr, backend), backend),
+    'folded': engine.evaluate_deep,
+}
+
+_NO_RESULT = object()
+
+
+def normalize(expr: str) -> str:
+    return ' '.join(expr.split())
+
+
+class ExpressionCache:
+    def __init__(self, maxsize=4096, store_results=True, max_length=65536):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        self.maxsize = maxsize
+        self.store_results = store_results
+        self.max_length = max_length
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bypassed = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _entry(self, expr, kind, backend):
+        key = (kind, backend.name if backend is not None else 'float', normalize(expr))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        compile_, _ = COMPILERS[kind]
+        entry = [compile_(expr, backend), _NO_RESULT]
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def program(self, expr: str, kind='engine', backend=None):
+        return self._entry(expr, kind, backend)[0]
+
+    def evaluate(self, expr: str, kind='engine', backend=None):
+        if len(expr) > self.max_length:
+            self.bypassed += 1
+            return DIRECT[kind](expr, backend)
+        entry = self._entry(expr, kind, backend)
+        result = entry[1]
+        if result is _NO_RESULT:
+            result = COMPILERS[kind][1](entry[0], backend)
+            if self.store_results:
+                entry[1] = result
+        return result
+
+    def invalidate(self, expr: str, kind=None) -> bool:
+        text = normalize(expr)
+        with self._lock:
+            keys = [k for k in self._entries
+                    if k[2] == text and (kind is None or k[0] == kind)]
+            for k in keys:
+                del self._entries[k]
+        return bool(keys)
+
+    def clear(self, reset_stats=False):
+        with self._lock:
+            self._entries.clear()
+            if reset_stats:
+                self.hits = self.misses = self.evictions = self.bypassed = 0
+
+    def resize(self, maxsize: int):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'size': len(self._entries), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'bypassed': self.bypassed,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+# one cache for every calculator in the process
+shared = ExpressionCache()
@@ -0,0 +1,99 @@
+# client.py
+# Blocking client for server.py.
+#   python client.py '2*(3+4)' '1+2'        python client.py --unix /tmp/calc.sock stats
+#   with Client() as c: c.evaluate('2*(3+4)')  ->  14.0
+import argparse
+import json
+import socket
+import sys
+
+
+class ServerError(ValueError):
+    pass
+
+
+class Client:
+    def __init__(self, host='127.0.0.1', port=9020, unix=None, timeout=10.0):
+        if unix is not None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(unix)
+        else:
+            self.sock = socket.create_connection((host, port), timeout)
+        self._file = self.sock.makefile('rb')
+        self._next_id = 0
+
+    def _send(self, requests):
+        lines = []
+        for req in requests:
+            self._next_id += 1
+            req.setdefault('id', self._next_id)
+            lines.append(json.dumps(req))
+        self.sock.sendall(('\n'.join(lines) + '\n').encode())
+
+    def _receive(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('server closed the connection')
+        return json.loads(line)
+
+    def request(self, **fields) -> dict:
+        self._send([fields])
+        return self._receive()
+
+    def evaluate(self, expr, mode='parens', backend='float', precision=None):
+        reply = self.request(expr=expr, mode=mode, backend=backend, precision=precision)
+        if 'error' in reply:
+            raise ServerError(reply['error'])
+        return reply['result']
+
+    def evaluate_many(self, exprs, mode='parens', backend='float', precision=None) -> list:
+        # pipelined: every request goes out before the first reply is read
+        exprs = list(exprs)
+        self._send([{'expr': e, 'mode': mode, 'backend': backend, 'precision': precision}
+                    for e in exprs])
+        return [self._receive() for _ in exprs]
+
+    def stats(self) -> dict:
+        return self.request(op='stats')['stats']
+
+    def close(self):
+        self._file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Send expressions to server.py.')
+    p.add_argument('exprs', nargs='+', help="expressions, or 'stats'")
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=9020)
+    p.add_argument('--unix', default=None)
+    p.add_argument('-m', '--mode', default='parens')
+    p.add_argument('--backend', default='float')
+    p.add_argument('--precision', type=int, default=None,
+                   help='significant digits; only with --backend decimal')
+    args = p.parse_args(argv)
+    if args.precision is not None and args.backend != 'decimal':
+        p.error('--precision needs --backend decimal')
+    failed = 0
+    with Client(args.host, args.port, args.unix) as c:
+        if args.exprs == ['stats']:
+            print(json.dumps(c.stats(), indent=2))
+            return 0
+        for reply in c.evaluate_many(args.exprs, args.mode, args.backend, args.precision):
+            if 'error' in reply:
+                failed += 1
+                print(f"error: {reply['error']}")
+            else:
+                print(reply['result'])
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
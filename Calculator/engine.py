@@ -0,0 +1,211 @@
+# engine.py
+# Single-pass evaluator for the calculators' left-to-right expressions.
+# The input is tokenized once, and an explicit stack of (operand, operator)
+# frames handles parentheses, so the cost is linear in expression length.
+# A minus where a value is expected negates the next number or bracket.
+import operator
+import re
+
+from instrument import perf_counter, probe, timed
+from scanner import NUMBER as _NUMBER, SYMBOLS as _SYMBOLS, TOKEN as _TOKEN, error_position, scan
+
+OPS = {'+': operator.add, '-': operator.sub,
+       '*': operator.mul, '/': operator.truediv}
+
+
+def tokenize(expr, backend=None) -> list:
+    # backend is a numeric.Backend; None reads numbers as float. bytes and
+    # buffers go through the lazy scanner.
+    number = float if backend is None else backend.number
+    if expr.__class__ is not str:
+        return list(scan(expr, number))
+    if probe.on:
+        return _tokenize_timed(expr, number)
+    try:
+        return [tok if tok in _SYMBOLS else number(tok) for tok in _TOKEN.findall(expr)]
+    except (ValueError, ArithmeticError):
+        raise error_position(expr, number) or ValueError('Invalid number') from None
+
+
+def _tokenize_timed(expr, number):
+    # tokenize with the regex and the number conversion timed apart
+    t0 = perf_counter()
+    raw = _TOKEN.findall(expr)
+    t1 = perf_counter()
+    probe.add('scan', t1 - t0)
+    try:
+        toks = [tok if tok in _SYMBOLS else number(tok) for tok in raw]
+    except (ValueError, ArithmeticError):
+        probe.add('convert', perf_counter() - t1, True)
+        raise error_position(expr, number) or ValueError('Invalid number') from None
+    probe.add('convert', perf_counter() - t1)
+    probe.count('tokens', len(toks))
+    return toks
+
+
+def _count_ops(toks):
+    if toks.__class__ is list:
+        probe.count('ops', sum(1 for tok in toks if tok.__class__ is str and tok in OPS))
+    probe.count('evaluations')
+
+
+def run(toks, backend=None) -> float:
+    if probe.on:
+        _count_ops(toks)
+        return timed('run', _run, toks, backend)
+    return _run(toks, backend)
+
+
+def _run(toks, backend=None) -> float:
+    frames = []
+    return _parse(toks, backend, frames, frames.append, frames.pop)
+
+
+def _parse(toks, backend, frames, push, pop) -> float:
+    # the parser behind run and run_deep; frames is the stack, tested for
+    # emptiness, and push/pop store and return (acc, op, negate) frames
+    if backend is None:
+        ops, neg = OPS, operator.neg
+    else:
+        ops, neg = backend.ops, backend.negate
+    acc = None
+    op = None
+    want_value = True
+    negate = False
+    for tok in toks:
+        if tok.__class__ is not str:
+            if not want_value:
+                raise ValueError('Missing operator')
+            if negate:
+                tok = neg(tok)
+                negate = False
+            acc = tok if op is None else ops[op](acc, tok)
+            want_value = False
+        elif tok in ops:
+            if want_value:
+                if tok != '-' or negate:
+                    raise ValueError(f'Unexpected operator {tok!r}')
+                negate = True
+                continue
+            op = tok
+            want_value = True
+        elif tok == '(':
+            if not want_value:
+                raise ValueError('Missing operator')
+            push((acc, op, negate))
+            acc = op = None
+            negate = False
+        else:
+            if not frames:
+                raise ValueError('Unmatched parentheses')
+            if want_value:
+                raise ValueError('Empty parentheses' if acc is None else 'Incomplete expression')
+            value = acc
+            acc, op, negated = pop()
+            if negated:
+                value = neg(value)
+            acc = value if op is None else ops[op](acc, value)
+            want_value = False
+    if frames:
+        raise ValueError('Unmatched parentheses')
+    if want_value:
+        raise ValueError('Incomplete expression')
+    return acc
+
+
+# run_deep is run with a compact frame stack for very deep nesting: the
+# operand before each open bracket goes in a list and its operator plus a
+# pending unary minus pack into one byte, about 9 bytes a level against 72
+# for a tuple frame. It is slower per bracket, so run stays the default.
+_OP_CODES = {None: 0, '+': 2, '-': 4, '*': 6, '/': 8}
+_CODE_OPS = (None, '+', '-', '*', '/')
+
+
+def _packed_frames():
+    accs = []
+    codes = bytearray()
+
+    def push(frame):
+        acc, op, negate = frame
+        accs.append(acc)
+        codes.append(_OP_CODES[op] | negate)
+
+    def pop():
+        code = codes.pop()
+        return accs.pop(), _CODE_OPS[code >> 1], code & 1
+
+    return codes, push, pop
+
+
+def run_deep(toks, backend=None) -> float:
+    if probe.on:
+        _count_ops(toks)
+        return timed('run_deep', _run_deep, toks, backend)
+    return _run_deep(toks, backend)
+
+
+def _run_deep(toks, backend=None) -> float:
+    return _parse(toks, backend, *_packed_frames())
+
+
+def evaluate_deep(expr, backend=None) -> float:
+    # tokens stream from the scanner, so memory grows with nesting depth only
+    return run_deep(scan(expr, float if backend is None else backend.number), backend)
+
+
+def evaluate(expr, backend=None) -> float:
+    if expr.__class__ is not str:
+        # buffers stream from the scanner into the parser, no token list
+        return run(scan(expr, float if backend is None else backend.number), backend)
+    return run(tokenize(expr, backend), backend)
+
+
+# left2right keeps its original lenient reading: unknown characters are
+# dropped and the tokens are taken as number (op number)*, where a minus
+# in front of a number is its sign.
+_L2R_TOKEN = re.compile(_NUMBER + r'|[+\-*/]')
+
+
+def _signed(toks):
+    out = []
+    sign = False
+    for tok in toks:
+        if tok == '-' and not sign and (not out or out[-1] in OPS):
+            sign = True
+            continue
+        out.append('-' + tok if sign else tok)
+        sign = False
+    if sign:
+        out.append('-')
+    return out
+
+
+def compile_left2right(expr: str, backend=None) -> tuple:
+    if probe.on:
+        return timed('l2r_compile', _compile_left2right, expr, backend)
+    return _compile_left2right(expr, backend)
+
+
+def _compile_left2right(expr, backend=None):
+    number, ops = (float, OPS) if backend is None else (backend.number, backend.ops)
+    toks = _L2R_TOKEN.findall(expr)
+    if '-' in toks:
+        toks = _signed(toks)
+    if not toks:
+        raise ValueError
+    steps = tuple((ops[op], number(num)) for op, num in zip(toks[1::2], toks[2::2]))
+    return number(toks[0]), steps
+
+
+def run_left2right(program, backend=None) -> float:
+    if probe.on:
+        probe.count('evaluations')
+        return timed('l2r_run', _run_left2right, program, backend)
+    return _run_left2right(program, backend)
+
+
+def _run_left2right(program, backend=None):
+    res, steps = program
+    for fn, num in steps:
+        res = fn(res, num)
+    return res
@@ -0,0 +1,153 @@
+# formula.py
+# Compiles an expression with variables, e.g. 'x*(y+2)', into a plain
+# Python function taking the variables in order of first appearance:
+#   f = compile_formula('x*(y+2)');  f(3, 4) -> 18.0;  f(x=3, y=4) -> 18.0
+# The calculator's rule is kept: operators apply left to right, with no
+# precedence, so 'a+b*c' compiles to '(a+b)*c'. The parse is the engine's
+# frame-stack pass over source text instead of values, adding brackets
+# only where Python's precedence would regroup the operands. Long or
+# deeply nested input is split into temporaries so the generated code
+# stays within the compiler's nesting limits.
+# Compiled functions are cached per expression (lru_cache); they hold no
+# state, so one function can be called from any number of threads.
+import keyword
+import math
+from functools import lru_cache
+import re
+
+from engine import OPS
+from scanner import NUMBER
+
+_TOKEN = re.compile(r'[A-Za-z_]\w*|' + NUMBER + r'|[+\-*/()]|\S')
+
+# a fragment of source: (text, level, ops, depth); level 0 is an atom,
+# 1 a product or quotient, 2 a sum or difference
+_MAX_OPS = 64
+_MAX_DEPTH = 16
+
+
+class _Builder:
+    def __init__(self, names):
+        self.lines = []
+        self.prefix = '_t'
+        while any(n.startswith(self.prefix) for n in names):
+            self.prefix = '_' + self.prefix
+        self.temps = 0
+
+    def temp(self, frag):
+        if frag[1] == 0:
+            return frag
+        name = f'{self.prefix}{self.temps}'
+        self.temps += 1
+        self.lines.append(f'    {name} = {frag[0]}')
+        return (name, 0, 0, 0)
+
+    def negate(self, frag):
+        text, level, ops, depth = frag
+        if level:
+            return (f'-({text})', 0, ops, depth + 1)
+        return (f'-{text}', 0, ops, depth)
+
+    def combine(self, a, op, b):
+        if a[2] + b[2] >= _MAX_OPS or max(a[3], b[3]) >= _MAX_DEPTH:
+            a = self.temp(a)
+            b = self.temp(b)
+        a_text, a_level, a_ops, a_depth = a
+        b_text, b_level, b_ops, b_depth = b
+        if op in '*/':
+            if a_level == 2:
+                a_text, a_depth = f'({a_text})', a_depth + 1
+            if b_level:
+                b_text, b_depth = f'({b_text})', b_depth + 1
+            level = 1
+        else:
+            if b_level == 2:
+                b_text, b_depth = f'({b_text})', b_depth + 1
+            level = 2
+        return (f'{a_text}{op}{b_text}', level, a_ops + b_ops + 1, max(a_depth, b_depth))
+
+
+def _constant(tok):
+    value = float(tok)
+    return repr(value) if math.isfinite(value) else '1e999'
+
+
+def translate(expr: str):
+    # (source of a function body, variable names)
+    names = []
+    for m in _TOKEN.finditer(expr):
+        tok = m.group()
+        if (tok[0].isalpha() or tok[0] == '_') and tok not in names:
+            if keyword.iskeyword(tok):
+                raise ValueError(f'{tok!r} is a reserved word')
+            names.append(tok)
+    b = _Builder(names)
+    frames = []
+    acc = None
+    op = None
+    want_value = True
+    negate = False
+    for m in _TOKEN.finditer(expr):
+        tok = m.group()
+        if tok in OPS:
+            if want_value:
+                if tok != '-' or negate:
+                    raise ValueError(f'Unexpected operator {tok!r}')
+                negate = True
+                continue
+            op = tok
+            want_value = True
+        elif tok == '(':
+            if not want_value:
+                raise ValueError('Missing operator')
+            frames.append((acc, op, negate))
+            acc = op = None
+            negate = False
+        elif tok == ')':
+            if not frames:
+                raise ValueError('Unmatched parentheses')
+            if want_value:
+                raise ValueError('Empty parentheses' if acc is None else 'Incomplete expression')
+            value = acc
+            acc, op, negated = frames.pop()
+            if negated:
+                value = b.negate(value)
+            acc = value if op is None else b.combine(acc, op, value)
+            want_value = False
+        else:
+            if not want_value:
+                raise ValueError('Missing operator')
+            if tok[0].isdigit() or tok[0] == '.':
+                value = (_constant(tok), 0, 0, 0)
+            elif tok in names:
+                value = (tok, 0, 0, 0)
+            else:
+                raise ValueError(f'Unexpected character {tok!r} at position {m.start()}')
+            if negate:
+                value = b.negate(value)
+                negate = False
+            acc = value if op is None else b.combine(acc, op, value)
+            want_value = False
+    if frames:
+        raise ValueError('Unmatched parentheses')
+    if want_value:
+        raise ValueError('Incomplete expression')
+    b.lines.append(f'    return {acc[0]}')
+    return '\n'.join(b.lines), names
+
+
+def build(expr: str):
+    body, names = translate(expr)
+    source = f'def formula({", ".join(names)}):\n{body}\n'
+    namespace = {'__builtins__': {}}
+    exec(compile(source, '<formula>', 'exec'), namespace)
+    fn = namespace['formula']
+    fn.expression = expr
+    fn.names = tuple(names)
+    fn.source = source
+    return fn
+
+
+@lru_cache(maxsize=1024)
+def compile_formula(expr: str):
+    return build(expr)
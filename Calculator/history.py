@@ -0,0 +1,355 @@
+# history.py
+# Persistent calculation history. Recent entries are kept in a ring buffer.
+# Every entry is appended to a log file that is read through mmap. A
+# sidecar index holds the entries sorted by value and by expression, so
+# value-range and expression-prefix lookups are binary searches over the
+# mapped file instead of a scan.
+#   log record:  time (d) | value (d) | n (I) | n bytes of utf-8 | size (I)
+#   index file:  header (magic, count, log offset covered) | offsets by
+#                value (Q) | values (d) | offsets by expression (Q)
+# Entries appended after the index was written, by this or any other
+# process sharing the log, are searched linearly until reindex() (called
+# by close()) merges them in. Writers hold an exclusive flock on the log
+# where fcntl is available, so records never interleave.
+import bisect
+from contextlib import contextmanager
+import mmap
+import os
+import struct
+import time
+from array import array
+from collections import deque, namedtuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+Entry = namedtuple('Entry', 'time expression value offset')
+
+_HEAD = struct.Struct('<ddI')
+_TAIL = struct.Struct('<I')
+_INDEX_HEAD = struct.Struct('<8sQQ')
+_MAGIC = b'CALCIDX1'
+
+DEFAULT_PATH = os.environ.get('CALC_HISTORY',
+                              os.path.join(os.path.expanduser('~'), '.calculator', 'history.log'))
+
+
+class HistoryLog:
+    def __init__(self, path=DEFAULT_PATH, ring_size=100, reindex_after=10000):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.reindex_after = reindex_after
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'ab')
+        self._map = None
+        self._index = None          # (values, by value, by expression) memoryviews
+        self._index_map = None
+        self._indexed_end = 0
+        self._end = 0               # log bytes covered by the index and the tail
+        self._tail = []             # offsets appended after the index
+        self.ring = deque(maxlen=ring_size)
+        with self._locked():
+            self._load_index()
+            self._end = self._indexed_end
+            self._refresh()
+        for entry in self.iter_reverse(limit=ring_size):
+            self.ring.appendleft(entry)
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        if fcntl is None:
+            yield
+            return
+        fd = self._file.fileno()
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    # -- log -----------------------------------------------------------------
+
+    def append(self, expression: str, value: float, when=None) -> Entry:
+        data = expression.encode('utf-8')
+        when = time.time() if when is None else when
+        record = (_HEAD.pack(when, value, len(data)) + data
+                  + _TAIL.pack(_HEAD.size + len(data) + _TAIL.size))
+        with self._locked(exclusive=True):
+            # other writers may have appended since this handle last looked
+            self._refresh()
+            offset = self._end
+            self._file.write(record)
+            self._file.flush()
+            self._end = offset + len(record)
+        entry = Entry(when, expression, value, offset)
+        self.ring.append(entry)
+        self._tail.append(offset)
+        return entry
+
+    def _view(self):
+        size = self._end
+        if size == 0:
+            return None
+        if self._map is None or len(self._map) < size:
+            if self._map is not None:
+                self._map.close()
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _refresh(self):
+        # takes in records other processes appended; call with the lock held
+        end = os.fstat(self._file.fileno()).st_size
+        if end <= self._end:
+            return
+        offset = self._end
+        self._end = end
+        m = self._view()
+        while offset < end:
+            self._tail.append(offset)
+            offset += _HEAD.size + _HEAD.unpack_from(m, offset)[2] + _TAIL.size
+
+    def refresh(self):
+        with self._locked():
+            self._refresh()
+
+    def read(self, offset: int) -> Entry:
+        m = self._view()
+        when, value, n = _HEAD.unpack_from(m, offset)
+        start = offset + _HEAD.size
+        return Entry(when, m[start:start + n].decode('utf-8'), value, offset)
+
+    def _expression_at(self, offset):
+        m = self._map
+        n = _HEAD.unpack_from(m, offset)[2]
+        start = offset + _HEAD.size
+        return m[start:start + n].decode('utf-8')
+
+    def __len__(self):
+        self.refresh()
+        return self._indexed_count() + len(self._tail)
+
+    def iter_reverse(self, limit=None):
+        # newest first, without reading the rest of the log
+        self.refresh()
+        m = self._view()
+        end = self._end
+        count = 0
+        while m is not None and end > 0 and (limit is None or count < limit):
+            size = _TAIL.unpack_from(m, end - _TAIL.size)[0]
+            end -= size
+            yield self.read(end)
+            count += 1
+
+    def page(self, start: int, count: int) -> list:
+        # entries start..start+count-1, counting back from the newest
+        it = self.iter_reverse(limit=start + count)
+        for _ in range(start):
+            next(it, None)
+        return list(it)
+
+    # -- index ---------------------------------------------------------------
+
+    def _indexed_count(self):
+        return len(self._index[0]) if self._index else 0
+
+    def _load_index(self):
+        self._close_index()
+        self._indexed_end = 0
+        try:
+            f = open(self.index_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            if os.fstat(f.fileno()).st_size < _INDEX_HEAD.size:
+                return
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, end = _INDEX_HEAD.unpack_from(m, 0)
+        if magic != _MAGIC or end > os.fstat(self._file.fileno()).st_size:
+            m.close()
+            return
+        mv = memoryview(m)
+        a = _INDEX_HEAD.size
+        b = a + 8 * count
+        c = b + 8 * count
+        self._index = (mv[b:c].cast('d'), mv[a:b].cast('Q'), mv[c:c + 8 * count].cast('Q'))
+        self._index_map = m
+        self._indexed_end = end
+
+    def _close_index(self):
+        if self._index is not None:
+            for view in self._index:
+                view.release()
+            self._index = None
+        if self._index_map is not None:
+            self._index_map.close()
+            self._index_map = None
+
+    def reindex(self):
+        # merges the tail into the index: only the tail is sorted, and each
+        # tail entry is placed by a binary search, so the work is the tail
+        # times log n plus one copy of the existing arrays
+        with self._locked(exclusive=True):
+            self._load_index()      # another process may have merged already
+            self._tail = []
+            self._end = self._indexed_end
+            self._refresh()
+            if not self._tail:
+                return
+            if self._index:
+                values, by_value, by_expr = self._index
+            else:
+                values, by_value, by_expr = array('d'), array('Q'), array('Q')
+            tail = [self.read(offset) for offset in self._tail]
+            tail_by_value = sorted(tail, key=lambda e: e.value)
+            tail_by_expr = sorted(tail, key=lambda e: e.expression)
+            value_at = [bisect.bisect_right(values, e.value) for e in tail_by_value]
+            expr_at = [bisect.bisect_right(by_expr, e.expression, key=self._expression_at)
+                       for e in tail_by_expr]
+            tmp = f'{self.index_path}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(_INDEX_HEAD.pack(_MAGIC, len(values) + len(tail), self._end))
+                _splice(by_value, value_at, [e.offset for e in tail_by_value], 'Q').tofile(f)
+                _splice(values, value_at, [e.value for e in tail_by_value], 'd').tofile(f)
+                _splice(by_expr, expr_at, [e.offset for e in tail_by_expr], 'Q').tofile(f)
+            self._close_index()
+            os.replace(tmp, self.index_path)
+            self._load_index()
+            self._tail = []
+
+    def search_prefix(self, prefix: str, limit=100) -> list:
+        self.refresh()
+        out = []
+        if self._index:
+            self._view()
+            by_expr = self._index[2]
+            key = self._expression_at
+            i = bisect.bisect_left(by_expr, prefix, key=key)
+            while i < len(by_expr) and len(out) < limit:
+                entry = self.read(by_expr[i])
+                if not entry.expression.startswith(prefix):
+                    break
+                out.append(entry)
+                i += 1
+        for offset in self._tail:
+            if len(out) >= limit:
+                break
+            entry = self.read(offset)
+            if entry.expression.startswith(prefix):
+                out.append(entry)
+        if len(self._tail) > self.reindex_after:
+            self.reindex()
+        return out
+
+    def search_range(self, low: float, high: float, limit=100) -> list:
+        self.refresh()
+        out = []
+        if self._index:
+            values, by_value = self._index[0], self._index[1]
+            i = bisect.bisect_left(values, low)
+            j = bisect.bisect_right(values, high)
+            out = [self.read(by_value[k]) for k in range(i, min(j, i + limit))]
+        for offset in self._tail:
+            if len(out) >= limit:
+                break
+            entry = self.read(offset)
+            if low <= entry.value <= high:
+                out.append(entry)
+        if len(self._tail) > self.reindex_after:
+            self.reindex()
+        return out
+
+    def close(self):
+        if self._tail:
+            self.reindex()
+        self._close_index()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _splice(old, positions, items, typecode) -> array:
+    # old with items[k] inserted before old[positions[k]]; positions ascend
+    out = array(typecode)
+    raw = memoryview(old).cast('B')
+    prev = 0
+    for pos, item in zip(positions, items):
+        out.frombytes(raw[8 * prev:8 * pos])
+        out.append(item)
+        prev = pos
+    out.frombytes(raw[8 * prev:])
+    raw.release()
+    return out
+
+
+class HistoryPanel:
+    # A Toplevel list of past results. Nothing is read until it is opened,
+    # and then only one page at a time as the list is scrolled; typing in
+    # the search box switches to a prefix lookup through the index.
+    PAGE = 50
+
+    def __init__(self, root, log, on_pick=None):
+        self.root = root
+        self.log = log
+        self.on_pick = on_pick
+        self.window = None
+
+    def toggle(self, event=None):
+        if self.window is not None:
+            self.window.destroy()
+            self.window = None
+            return
+        import tkinter as tk
+        self.window = tk.Toplevel(self.root)
+        self.window.title('History')
+        self.window.protocol('WM_DELETE_WINDOW', self.toggle)
+        self.query = tk.Entry(self.window, font=('Arial', 12))
+        self.query.pack(fill='x', padx=4, pady=4)
+        self.query.bind('<KeyRelease>', self._search)
+        self.listbox = tk.Listbox(self.window, font=('Arial', 12), width=40, height=15)
+        self.listbox.pack(fill='both', expand=True, padx=4, pady=(0, 4))
+        self.listbox.bind('<Double-Button-1>', self._pick)
+        self.listbox.config(yscrollcommand=self._scrolled)
+        self._show([])
+        self._more()
+
+    def _show(self, entries):
+        self.entries = list(entries)
+        self.listbox.delete(0, 'end')
+        for entry in self.entries:
+            self.listbox.insert('end', f'{entry.expression} = {entry.value:.10g}')
+        self.paged = not self.query.get()
+
+    def _more(self):
+        page = self.log.page(len(self.entries), self.PAGE)
+        for entry in page:
+            self.entries.append(entry)
+            self.listbox.insert('end', f'{entry.expression} = {entry.value:.10g}')
+        if len(page) < self.PAGE:
+            self.paged = False
+
+    def _scrolled(self, first, last):
+        if self.paged and float(last) >= 0.9:
+            self._more()
+
+    def _search(self, event=None):
+        prefix = self.query.get()
+        self._show(self.log.search_prefix(prefix) if prefix else [])
+        if not prefix:
+            self._more()
+
+    def _pick(self, event=None):
+        selection = self.listbox.curselection()
+        if selection and self.on_pick is not None:
+            self.on_pick(self.entries[selection[0]])
@@ -0,0 +1,118 @@
+# instrument.py
+# Stage timers and counters for the evaluation pipeline, plus an opt-in
+# cProfile capture. Instrumented code checks probe.on once per call and
+# takes its plain path when it is off, so the disabled cost is one
+# attribute test.
+#   CALC_STATS=1      start with the stage timers on
+#   CALC_PROFILE=out.prof   wrap batch runs in cProfile and dump there
+#   instrument.enable(); ...; instrument.stats()  ->  {'scan': {...}, ...}
+# Stages: scan (regex), convert (number()), run and run_deep (parser and
+# OPS dispatch), l2r_compile, l2r_run, fold, rpn. Counters: tokens, ops,
+# evaluations.
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+perf_counter = time.perf_counter
+
+
+class Probe:
+    def __init__(self):
+        self.on = False
+        self._lock = threading.Lock()
+        self.timers = {}      # stage -> [calls, seconds, errors]
+        self.counters = {}
+
+    def add(self, stage, seconds, error=False):
+        with self._lock:
+            t = self.timers.get(stage)
+            if t is None:
+                t = self.timers[stage] = [0, 0.0, 0]
+            t[0] += 1
+            t[1] += seconds
+            t[2] += error
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {stage: {'calls': calls, 'seconds': seconds, 'errors': errors,
+                           'mean_us': seconds / calls * 1e6 if calls else 0.0}
+                   for stage, (calls, seconds, errors) in self.timers.items()}
+            out.update(self.counters)
+        return out
+
+
+probe = Probe()
+probe.on = bool(os.environ.get('CALC_STATS'))
+
+
+def enable():
+    probe.on = True
+
+
+def disable():
+    probe.on = False
+
+
+def reset():
+    probe.reset()
+
+
+def stats() -> dict:
+    return probe.stats()
+
+
+def timed(stage, fn, *args):
+    t0 = perf_counter()
+    try:
+        result = fn(*args)
+    except BaseException:
+        probe.add(stage, perf_counter() - t0, True)
+        raise
+    probe.add(stage, perf_counter() - t0)
+    return result
+
+
+def format_stats(data=None) -> list:
+    data = stats() if data is None else data
+    lines = [f'{"stage":<12}{"calls":>10}{"seconds":>11}{"mean us":>10}{"errors":>8}']
+    total = sum(v['seconds'] for v in data.values() if isinstance(v, dict)) or 1.0
+    for stage, v in sorted(data.items(), key=lambda kv: -kv[1]['seconds']
+                           if isinstance(kv[1], dict) else 0):
+        if isinstance(v, dict):
+            lines.append(f'{stage:<12}{v["calls"]:>10}{v["seconds"]:>11.4f}'
+                         f'{v["mean_us"]:>10.2f}{v["errors"]:>8}'
+                         f'  {v["seconds"] / total:>5.1%}')
+        else:
+            lines.append(f'{stage:<12}{v:>10}')
+    return lines
+
+
+def profile_path():
+    return os.environ.get('CALC_PROFILE') or None
+
+
+@contextmanager
+def profiled(path=None):
+    # cProfile the block and write a .prof dump (pstats / snakeviz) to path
+    path = path or profile_path()
+    if path is None:
+        yield None
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield prof
+    finally:
+        prof.disable()
+        prof.dump_stats(path)
@@ -0,0 +1,215 @@
+# keytrace.py
+# Records key presses from the calculator front ends to a compact trace
+# file and replays them as fast as possible, reporting per-event latency.
+#   python keytrace.py record infix session.ktr     (opens the Tk app)
+#   python keytrace.py synth parens deep.ktr --events 20000 --depth 200
+#   python keytrace.py replay deep.ktr [--live]
+# Trace format: one JSON header line {"mode", "keys"} followed by packed
+# (key index: uint8, delay since previous event in us: uint32) records.
+import argparse
+import json
+import random
+import struct
+import sys
+import time
+
+import states
+from loader import load_script
+
+EVENT = struct.Struct('<BI')
+
+STATES = {'infix': states.InfixState, 'rpn': states.RPNState,
+          'parens': states.BracketState}
+CLICK = {'infix': 'on_click', 'rpn': 'on_click', 'parens': 'on_button_click'}
+
+BRANCHES = {'(': 'open', ')': 'close', '=': 'equals', 'EN': 'enter',
+            'M': 'memory', 'MR': 'memory', 'MC': 'memory',
+            'M+': 'memory', 'M-': 'memory', 'Reg': 'memory',
+            'C': 'clear', 'AC': 'clear', 'Del': 'clear'}
+
+
+def branch(key):
+    if key in states.DIGITS:
+        return 'digit'
+    if key in '+-*/':
+        return 'operator'
+    return BRANCHES.get(key, key)
+
+
+class Trace:
+    def __init__(self, mode, events=None):
+        self.mode = mode
+        self.events = events if events is not None else []   # (key, delay_us)
+
+    def __len__(self):
+        return len(self.events)
+
+    def keys(self):
+        return [k for k, _ in self.events]
+
+    def save(self, path):
+        table = sorted({k for k, _ in self.events})
+        index = {k: i for i, k in enumerate(table)}
+        pack = EVENT.pack
+        with open(path, 'wb') as f:
+            f.write(json.dumps({'mode': self.mode, 'keys': table}).encode() + b'\n')
+            f.write(b''.join(pack(index[k], min(d, 0xFFFFFFFF)) for k, d in self.events))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            data = f.read()
+        table = header['keys']
+        events = [(table[i], d) for i, d in EVENT.iter_unpack(data)]
+        return cls(header['mode'], events)
+
+
+class Recorder:
+    # wraps the front end's click handler on the instance
+    def __init__(self, app, mode):
+        self.trace = Trace(mode)
+        self._last = time.perf_counter()
+        name = CLICK[mode]
+        handler = getattr(app, name)
+
+        def recording(key):
+            now = time.perf_counter()
+            self.trace.events.append((key, int((now - self._last) * 1e6)))
+            self._last = now
+            return handler(key)
+        setattr(app, name, recording)
+
+
+def synthesize(mode, events, depth=0, seed=9020):
+    rng = random.Random(seed)
+    out = []
+    enter = 'EN' if mode == 'rpn' else '='
+    open_ = 0
+    while len(out) < events:
+        if mode == 'parens' and open_ < depth and rng.random() < 0.3:
+            out.append('(')
+            open_ += 1
+        out.extend(str(rng.randint(1, 999)))
+        if mode == 'parens' and open_ and rng.random() < 0.1:
+            out.append(')')
+            open_ -= 1
+        r = rng.random()
+        if mode == 'rpn':
+            out.append('EN' if r < 0.5 else rng.choice('+-*'))
+        elif r < 0.05 and not open_:
+            out.append(enter)
+        else:
+            out.append(rng.choice('+-*'))
+    return Trace(mode, [(k, 0) for k in out[:events]])
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def replay(trace, live=False):
+    # returns (total seconds, [(key, ns)])
+    if live:
+        module = load_script(trace.mode)
+        if trace.mode == 'parens':
+            import tkinter as tk
+            root = tk.Tk()
+            app = module.Calculator(root)
+        else:
+            app = module.App()
+            root = app.root
+        root.withdraw()
+        handle = getattr(app, CLICK[trace.mode])
+    else:
+        root = None
+        handle = STATES[trace.mode]()._press
+    clock = time.perf_counter_ns
+    samples = []
+    append = samples.append
+    t0 = time.perf_counter()
+    for key, _ in trace.events:
+        start = clock()
+        try:
+            handle(key)
+        except (ValueError, ZeroDivisionError):
+            pass
+        append((key, clock() - start))
+    if root is not None:
+        root.update_idletasks()
+    total = time.perf_counter() - t0
+    if root is not None:
+        root.destroy()
+    return total, samples
+
+
+def report(total, samples, out=sys.stdout):
+    lat = sorted(ns for _, ns in samples)
+    n = len(lat)
+    print(f'{n} events in {total:.3f}s, {n / total if total else 0:,.0f} events/s', file=out)
+    print(f'latency us  p50 {percentile(lat, 50) / 1e3:.2f}  p95 {percentile(lat, 95) / 1e3:.2f}  '
+          f'p99 {percentile(lat, 99) / 1e3:.2f}  max {lat[-1] / 1e3 if lat else 0:.2f}', file=out)
+    groups = {}
+    for key, ns in samples:
+        groups.setdefault(branch(key), []).append(ns)
+    spent = sum(lat) or 1
+    print(f'{"branch":<10}{"events":>9}{"p50 us":>10}{"p95 us":>10}{"p99 us":>10}{"share":>8}', file=out)
+    for name, values in sorted(groups.items(), key=lambda kv: -sum(kv[1])):
+        values.sort()
+        print(f'{name:<10}{len(values):>9}{percentile(values, 50) / 1e3:>10.2f}'
+              f'{percentile(values, 95) / 1e3:>10.2f}{percentile(values, 99) / 1e3:>10.2f}'
+              f'{sum(values) / spent:>8.1%}', file=out)
+
+
+def record_session(mode, path):
+    module = load_script(mode)
+    if mode == 'parens':
+        import tkinter as tk
+        root = tk.Tk()
+        app = module.Calculator(root)
+    else:
+        app = module.App()
+        root = app.root
+    recorder = Recorder(app, mode)
+    try:
+        root.mainloop()
+    finally:
+        recorder.trace.save(path)
+        print(f'{len(recorder.trace)} events written to {path}')
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog='keytrace.py')
+    sub = p.add_subparsers(dest='cmd', required=True)
+    r = sub.add_parser('record', help='run a front end and record its key presses')
+    r.add_argument('mode', choices=sorted(STATES))
+    r.add_argument('path')
+    s = sub.add_parser('synth', help='write a generated trace')
+    s.add_argument('mode', choices=sorted(STATES))
+    s.add_argument('path')
+    s.add_argument('--events', type=int, default=10000)
+    s.add_argument('--depth', type=int, default=0, help='maximum bracket nesting (parens)')
+    s.add_argument('--seed', type=int, default=9020)
+    y = sub.add_parser('replay', help='replay a trace and report latency')
+    y.add_argument('path')
+    y.add_argument('--live', action='store_true', help='drive the Tk front end instead of the state machine')
+    args = p.parse_args(argv)
+
+    if args.cmd == 'record':
+        record_session(args.mode, args.path)
+    elif args.cmd == 'synth':
+        trace = synthesize(args.mode, args.events, args.depth, args.seed)
+        trace.save(args.path)
+        print(f'{len(trace)} events written to {args.path}')
+    else:
+        trace = Trace.load(args.path)
+        print(f'{trace.mode} trace, {"live Tk" if args.live else "headless"} replay')
+        report(*replay(trace, args.live))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+# launcher.py
+# One window for all three calculator modes. The root, display, labels and
+# button grid are built once; switching modes relabels the buttons from the
+# shared layout (layout.py) and re-renders the mode's state, which stays
+# alive in the background. Each mode's state machine is created on first
+# use.
+#   python launcher.py [infix|rpn|parens]      F1/F2/F3 switch modes
+import sys
+import time
+import tkinter as tk
+
+import history
+import layout
+import monitor
+import registers
+import render
+import states
+
+MODES = layout.MODES
+STATES = {'infix': states.InfixState, 'rpn': states.RPNState, 'parens': states.BracketState}
+
+
+class Launcher:
+    def __init__(self, mode='infix', coalesce=True, history_log=None, memory_bank=None):
+        self.root = tk.Tk()
+        self.root.configure(bg='#f2f2f2')
+        self.mode = None
+        self.states = {}
+        self.memory = 0.0
+        self.register = 0
+        # one bank for all modes
+        self.memory_bank = memory_bank if memory_bank is not None else registers.MemoryBank()
+        self.highlighted_op = None
+        self.operator_buttons = {}
+        self.last_switch_ms = 0.0
+        self.history_log = history_log
+
+        bar = tk.Frame(self.root, bg='#f2f2f2')
+        bar.grid(row=0, column=0, columnspan=4, pady=(6, 0))
+        self.mode_buttons = {}
+        for i, name in enumerate(MODES):
+            btn = tk.Button(bar, text=MODES[name]['label'], width=8, font=('Arial', 11),
+                            relief='raised', command=lambda m=name: self.switch(m))
+            btn.grid(row=0, column=i, padx=3)
+            self.mode_buttons[name] = btn
+            self.root.bind(f'<F{i + 1}>', lambda event, m=name: self.switch(m))
+        if history_log is not None:
+            self.history_panel = history.HistoryPanel(self.root, history_log, self._recall)
+            self.root.bind('<Control-h>', self.history_panel.toggle)
+
+        self.e = tk.Entry(self.root, font=('Arial', 28), bd=4,
+                          relief='sunken', justify='right', width=15)
+        self.e.grid(row=1, column=0, columnspan=4, pady=(10, 5))
+        layout.bind_input(self, self.e)
+
+        self.info_label = tk.Label(self.root, text='', font=('Arial', 10),
+                                   bg='#f2f2f2', fg='#333', anchor='w')
+        self.info_label.grid(row=2, column=0, columnspan=4, sticky='ew', padx=10)
+
+        self.mem_label = tk.Label(self.root, text='M: 0', font=('Arial', 12),
+                                  bg='#f2f2f2', fg='#666', anchor='w')
+        self.mem_label.grid(row=3, column=0, columnspan=4, sticky='ew', padx=10)
+
+        self.renderer = render.Renderer(self.root, coalesce)
+        self.renderer.add_view('display', self._paint_display, '')
+        self.renderer.add_view('info', self._paint_info, '')
+        self.renderer.add_view('memory', self._paint_memory, (0, 0.0))
+        self.renderer.add_view('highlight', self._paint_highlight, None)
+
+        # the shared grid: as many buttons as the largest layout
+        self.buttons = []
+        self.labels = {}
+        self.colors = {}
+        for i in range(max(len(m['buttons']) for m in MODES.values())):
+            btn = layout.make_button(self.root, lambda i=i: self.on_click(self.labels[i]))
+            layout.add_hover_effect(self, btn)
+            self.buttons.append(btn)
+
+        self.switch(mode)
+
+    def state_for(self, mode):
+        state = self.states.get(mode)
+        if state is None:
+            state = STATES[mode](bank=self.memory_bank)
+            if self.history_log is not None:
+                state.on_result = self.history_log.append
+            self.states[mode] = state
+        return state
+
+    def switch(self, mode):
+        if mode == self.mode:
+            return
+        t0 = time.perf_counter()
+        if self.mode is not None:
+            state = self.states[self.mode]
+            if not self.renderer.pending('display'):
+                state.display = self.e.get()
+        self.renderer.flush()
+        self._clear_op_highlight()
+        self.mode = mode
+        spec = MODES[mode]
+        self.root.title(spec['title'])
+        labels = spec['buttons']
+        self.operator_buttons = {}
+        for i, btn in enumerate(self.buttons):
+            if i < len(labels):
+                text = labels[i]
+                bg, fg = layout.button_colors(text)
+                btn.config(text=text, bg=bg, fg=fg)
+                self.labels[i] = text
+                self.colors[btn] = bg
+                if text in layout.OPS:
+                    self.operator_buttons[text] = btn
+                r, c = divmod(i, 4)
+                btn.grid(row=r + 4, column=c, padx=4, pady=4)
+            else:
+                btn.grid_remove()
+        for name, btn in self.mode_buttons.items():
+            btn.config(relief='sunken' if name == mode else 'raised')
+        self.render(self.state_for(mode).snapshot())
+        self.renderer.flush()
+        self.last_switch_ms = (time.perf_counter() - t0) * 1e3
+
+    def on_click(self, ch):
+        state = self.states[self.mode]
+        if not self.renderer.pending('display'):
+            state.display = self.renderer.shown['display'] = self.e.get()
+        self.render(state.press(ch))
+
+    def _recall(self, entry):
+        self.render(self.states[self.mode].recall(entry.value))
+
+    def on_key(self, event):
+        button = self.states[self.mode].key_button(event.char, event.keysym)
+        if button:
+            self.on_click(button)
+            return 'break'
+
+    def on_paste(self, event=None):
+        return layout.paste(self, self.states[self.mode], self.e)
+
+    def render(self, snap):
+        mark = self.renderer.mark
+        mark('display', snap.display)
+        mark('info', snap.stack if snap.stack is not None else snap.history)
+        mark('memory', (snap.register, snap.memory))
+        mark('highlight', snap.highlight)
+
+    def _paint_display(self, text):
+        self.e.delete(0, tk.END)
+        self.e.insert(0, text)
+
+    def _paint_info(self, text):
+        self.info_label.config(text=text)
+
+    def _paint_memory(self, value):
+        self.register, self.memory = value
+        self.mem_label.config(text=registers.label(self.register, self.memory))
+
+    def _paint_highlight(self, op):
+        self._clear_op_highlight()
+        if op:
+            self.operator_buttons[op].config(bg=layout.HIGHLIGHT_BG)
+            self.highlighted_op = op
+
+    def _clear_op_highlight(self):
+        if self.highlighted_op:
+            btn = self.operator_buttons.get(self.highlighted_op)
+            if btn:
+                btn.config(bg=layout.OPERATOR_BG)
+            self.highlighted_op = None
+        self.renderer.shown['highlight'] = None
+
+    def run(self):
+        mon = monitor.from_env(self)
+        try:
+            self.root.mainloop()
+        finally:
+            if mon is not None:
+                mon.stop()
+            if self.history_log is not None:
+                self.history_log.close()
+            self.memory_bank.close()
+
+
+if __name__ == '__main__':
+    Launcher(sys.argv[1] if len(sys.argv) > 1 else 'infix',
+             history_log=history.HistoryLog(),
+             memory_bank=registers.MemoryBank(path=registers.DEFAULT_PATH)).run()
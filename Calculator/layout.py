@@ -0,0 +1,115 @@
+# layout.py
+# The button grid shared by the three calculator windows and the launcher:
+# each mode's labels and title, the button colours, the hover effect and the
+# key and paste bindings.
+import tkinter as tk
+
+import rpn
+
+OPS = '+-*/'
+
+MODES = {
+    'infix': {'label': 'INFIX', 'title': 'Continuous Calculator',
+              'buttons': ['7', '8', '9', '/',
+                          '4', '5', '6', '*',
+                          '1', '2', '3', '-',
+                          '0', '.', '=', '+',
+                          'M', 'MR', 'MC', 'C',
+                          'M+', 'M-', 'Reg']},
+    'rpn': {'label': 'RPN', 'title': 'RPN Calculator',
+            'buttons': ['7', '8', '9', '/',
+                        '4', '5', '6', '*',
+                        '1', '2', '3', '-',
+                        '0', '.', 'EN', '+',
+                        'M', 'MR', 'MC', 'C',
+                        'M+', 'M-', 'Reg', 'DEPTH',
+                        'DUP', 'DROP', 'SWAP', 'OVER',
+                        'ROT', 'ROLL', 'PICK', 'DROPN']},
+    'parens': {'label': '( )', 'title': 'Continuous Calculator with Parentheses',
+               'buttons': ['(', ')', 'C', 'AC',
+                           '7', '8', '9', '/',
+                           '4', '5', '6', '*',
+                           '1', '2', '3', '-',
+                           '0', '.', '=', '+',
+                           'M', 'MR', 'MC', 'Del',
+                           'M+', 'M-', 'Reg']},
+}
+
+OPERATOR_BG = '#4d90fe'
+HIGHLIGHT_BG = '#6bff90'
+HOVER = {'#4d90fe': '#6ba3ff', '#9c27b0': '#ba68c8',
+         '#ff6b6b': '#ff8a8a', '#ffa500': '#ffb733'}
+
+
+def button_colors(text):
+    if text in OPS or text in ('=', 'EN'):
+        return OPERATOR_BG, 'white'
+    if text in ('(', ')') or text in rpn.WORDS:
+        return '#9c27b0', 'white'
+    if text in ('M', 'MR', 'MC', 'M+', 'M-', 'Reg'):
+        return '#ff6b6b', 'white'
+    if text in ('C', 'AC', 'Del'):
+        return '#ffa500', 'white'
+    return 'white', 'black'
+
+
+def make_button(root, command, text=''):
+    bg, fg = button_colors(text)
+    return tk.Button(root, text=text, width=5, height=2, font=('Arial', 18),
+                     bg=bg, fg=fg, activebackground='#d0e1ff', command=command)
+
+
+def add_hover_effect(app, button):
+    # app.colors maps each button to its resting colour; a highlighted
+    # operator keeps its highlight
+    def highlighted():
+        return app.highlighted_op and app.operator_buttons.get(app.highlighted_op) == button
+
+    def on_enter(event):
+        if not highlighted():
+            button.config(bg=HOVER.get(app.colors[button], '#e6e6e6'))
+
+    def on_leave(event):
+        button.config(bg=HIGHLIGHT_BG if highlighted() else app.colors[button])
+
+    button.bind('<Enter>', on_enter)
+    button.bind('<Leave>', on_leave)
+
+
+def build_grid(app, root, mode, handler, first_row):
+    # the mode's buttons, four to a row from first_row; fills app.colors
+    # and app.operator_buttons. Buttons call app.<handler> by name when
+    # pressed, so a wrapper installed later (keytrace, monitor) sees them
+    app.colors = {}
+    buttons = []
+    for i, text in enumerate(MODES[mode]['buttons']):
+        btn = make_button(root, lambda ch=text: getattr(app, handler)(ch), text)
+        r, c = divmod(i, 4)
+        btn.grid(row=first_row + r, column=c, padx=4, pady=4)
+        app.colors[btn] = button_colors(text)[0]
+        if text in OPS:
+            app.operator_buttons[text] = btn
+        add_hover_effect(app, btn)
+        buttons.append(btn)
+    return buttons
+
+
+def bind_input(app, entry):
+    # keys and paste go to the state machine; the entry would otherwise
+    # insert them itself
+    for widget in (app.root, entry):
+        widget.bind('<Key>', app.on_key)
+        for seq in ('<<Paste>>', '<Control-v>', '<Control-V>'):
+            widget.bind(seq, app.on_paste)
+
+
+def paste(app, state, entry):
+    # the whole clipboard in one state.paste call and one repaint
+    try:
+        text = app.root.clipboard_get()
+    except tk.TclError:
+        return 'break'
+    if not app.renderer.pending('display'):
+        state.display = app.renderer.shown['display'] = entry.get()
+    app.render(state.paste(text))
+    return 'break'
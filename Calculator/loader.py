@@ -0,0 +1,24 @@
+# loader.py
+# The calculator scripts have file names that are not valid module names
+# ("4-function calculator.py"), so tools load them by path.
+import importlib.util
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCRIPTS = {'parens': '4-function calculator.py',
+           'infix': 'INFIX_mode.py',
+           'rpn': 'RPN_mode.py'}
+
+
+def load_script(name: str):
+    filename = SCRIPTS.get(name, name)
+    modname = 'calc_' + name.replace('-', '_').replace(' ', '_').replace('.py', '')
+    if modname in sys.modules:
+        return sys.modules[modname]
+    spec = importlib.util.spec_from_file_location(modname, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[modname] = module
+    spec.loader.exec_module(module)
+    return module
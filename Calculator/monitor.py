@@ -0,0 +1,120 @@
+# monitor.py
+# Optional responsiveness monitor for the Tk front ends. Two measures:
+#   lag    an after() heartbeat every interval ms; how late each beat
+#          fires is how long the event loop was stalled
+#   input  from a button command (or key) being invoked to the renderer
+#          flush that puts its result in the widgets
+# Rolling p50/p95/p99/max of both go to a small overlay in the window's
+# corner and/or a JSON-lines log.
+#   CALC_MONITOR=overlay python INFIX_mode.py
+#   CALC_MONITOR=ui.jsonl python RPN_mode.py       ('-' logs to stderr)
+import json
+import os
+import sys
+import time
+from collections import deque
+
+perf_counter = time.perf_counter
+
+
+def percentiles(values) -> dict:
+    data = sorted(values)
+    if not data:
+        return {'n': 0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    n = len(data)
+    return {'n': n, 'p50': data[n // 2] * 1e3, 'p95': data[min(n - 1, n * 95 // 100)] * 1e3,
+            'p99': data[min(n - 1, n * 99 // 100)] * 1e3, 'max': data[-1] * 1e3}
+
+
+class Monitor:
+    def __init__(self, root, interval=50, window=2000, report_every=2.0, log=None):
+        self.root = root
+        self.interval = interval
+        self.report_every = report_every
+        self.lag = deque(maxlen=window)        # seconds late, per heartbeat
+        self.input = deque(maxlen=window)      # seconds, invoke to flush
+        self.keys = 0
+        self._pending = []
+        self._beat = None
+        self._expected = None
+        self._last_report = 0.0
+        self._log = log
+        self._owns_log = False
+        self.label = None
+        if isinstance(log, str):
+            self._log = sys.stderr if log == '-' else open(log, 'a', encoding='utf-8')
+            self._owns_log = log != '-'
+
+    def attach(self, app, handler='on_click'):
+        # time app.<handler> through to app.renderer's next flush
+        click = getattr(app, handler)
+        pending = self._pending
+
+        def timed_click(*args):
+            pending.append(perf_counter())
+            return click(*args)
+
+        setattr(app, handler, timed_click)
+        app.renderer.on_flush = self._flushed
+        return self
+
+    def _flushed(self):
+        if self._pending:
+            now = perf_counter()
+            self.input.extend(now - t for t in self._pending)
+            self.keys += len(self._pending)
+            self._pending.clear()
+
+    def start(self):
+        self._expected = perf_counter() + self.interval / 1e3
+        self._beat = self.root.after(self.interval, self._heartbeat)
+        return self
+
+    def stop(self):
+        if self._beat is not None:
+            self.root.after_cancel(self._beat)
+            self._beat = None
+        if self._owns_log:
+            self._log.close()
+            self._log = None
+
+    def _heartbeat(self):
+        now = perf_counter()
+        self.lag.append(max(0.0, now - self._expected))
+        self._expected = now + self.interval / 1e3
+        self._beat = self.root.after(self.interval, self._heartbeat)
+        if now - self._last_report >= self.report_every:
+            self._last_report = now
+            self.report()
+
+    def stats(self) -> dict:
+        return {'lag_ms': percentiles(self.lag), 'input_ms': percentiles(self.input),
+                'keys': self.keys}
+
+    def overlay(self):
+        import tkinter as tk
+        self.label = tk.Label(self.root, font=('Arial', 8), bg='#f2f2f2', fg='#999')
+        self.label.place(relx=1.0, rely=1.0, anchor='se')
+        return self
+
+    def report(self):
+        s = self.stats()
+        if self.label is not None:
+            lag, inp = s['lag_ms'], s['input_ms']
+            self.label.config(text=f"lag p99 {lag['p99']:.1f}ms  "
+                                   f"input p50 {inp['p50']:.1f} p99 {inp['p99']:.1f}ms")
+        if self._log is not None:
+            s['time'] = time.time()
+            self._log.write(json.dumps(s) + '\n')
+            self._log.flush()
+
+
+def from_env(app, handler='on_click'):
+    # a started Monitor if CALC_MONITOR is set, else None
+    target = os.environ.get('CALC_MONITOR')
+    if not target:
+        return None
+    mon = Monitor(app.root, log=None if target == 'overlay' else target)
+    if target == 'overlay':
+        mon.overlay()
+    return mon.attach(app, handler).start()
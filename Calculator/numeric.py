@@ -0,0 +1,68 @@
+# numeric.py
+# Numeric backends for the engine, the cache and the RPN machine. A backend
+# turns number tokens into values and supplies the OPS table used on them:
+#   float     the calculators' default
+#   int       exact integers; a division that does not divide evenly
+#             (or a decimal literal) falls back to float
+#   fraction  fractions.Fraction, exact throughout
+#   decimal   decimal.Decimal with a configurable precision
+import decimal
+import operator
+from fractions import Fraction
+
+
+class Backend:
+    def __init__(self, name, number, ops, negate=operator.neg):
+        self.name = name
+        self.number = number
+        self.ops = ops
+        self.negate = negate
+
+    def __repr__(self):
+        return f'<backend {self.name}>'
+
+
+def _int_number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _int_div(a, b):
+    if a.__class__ is int and b.__class__ is int and b and not a % b:
+        return a // b
+    return a / b
+
+
+FLOAT = Backend('float', float, {'+': operator.add, '-': operator.sub,
+                                 '*': operator.mul, '/': operator.truediv})
+INT = Backend('int', _int_number, {'+': operator.add, '-': operator.sub,
+                                   '*': operator.mul, '/': _int_div})
+FRACTION = Backend('fraction', Fraction, {'+': operator.add, '-': operator.sub,
+                                          '*': operator.mul, '/': operator.truediv})
+
+
+def decimal_backend(precision=28) -> Backend:
+    ctx = decimal.Context(prec=precision)
+    return Backend(f'decimal:{precision}', ctx.create_decimal,
+                   {'+': ctx.add, '-': ctx.subtract,
+                    '*': ctx.multiply, '/': ctx.divide}, ctx.minus)
+
+
+DECIMAL = decimal_backend()
+
+BACKENDS = {'float': FLOAT, 'int': INT, 'fraction': FRACTION, 'decimal': DECIMAL}
+
+
+def get_backend(backend=None, precision=None) -> Backend:
+    if backend is None:
+        return FLOAT
+    if isinstance(backend, Backend):
+        return backend
+    if backend == 'decimal' and precision is not None:
+        return decimal_backend(precision)
+    try:
+        return BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f'Unknown numeric backend {backend!r}') from None
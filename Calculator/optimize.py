@@ -0,0 +1,106 @@
+# optimize.py
+# Constant folding with reuse of repeated parenthesised groups. One pass
+# over the tokens keeps a frame per open bracket; when a group closes it is
+# evaluated and its value goes into the enclosing frame, so the work is
+# linear in the expression length. Each group is keyed on its tokens, with
+# inner groups standing as placeholders (#0, #1, ...) naming their value;
+# identical groups map to the same placeholder however they are spaced, so
+# each distinct group is evaluated once and every copy after that is a
+# dictionary hit. Values come from engine.run with the same operand order,
+# so results are identical to engine.evaluate.
+#   toks, report = fold('(1.07*3)+(1.07*3)*2')
+#   report.reused  ->  1
+import engine
+from instrument import probe, timed
+from scanner import SYMBOLS, TOKEN
+
+
+class FoldReport:
+    def __init__(self):
+        self.groups = 0        # groups seen
+        self.evaluated = 0     # groups actually evaluated
+        self.reused = 0        # groups answered from the memo
+        self.ops_saved = 0     # operator applications skipped by reuse
+
+    def __repr__(self):
+        return (f'FoldReport(groups={self.groups}, evaluated={self.evaluated}, '
+                f'reused={self.reused}, ops_saved={self.ops_saved})')
+
+
+class FoldMemo:
+    # folded groups; may be shared between expressions and backends
+    def __init__(self):
+        self.groups = {}    # (backend name, group tokens) -> placeholder
+        self.values = {}    # placeholder -> value
+        self.ops = {}       # placeholder -> operator applications in the group
+
+    def __len__(self):
+        return len(self.groups)
+
+
+def _fold(expr, backend, memo, report):
+    number = float if backend is None else backend.number
+    kind = 'float' if backend is None else backend.name
+    groups, values, ops = memo.groups, memo.values, memo.ops
+    frames = []
+    toks = []       # tokens for engine.run, values in place of groups
+    key = [kind]    # the same tokens as text, placeholders for groups
+    count = 0       # operator applications, counting folded groups
+    for tok in TOKEN.findall(expr):
+        if tok == '(':
+            frames.append((toks, key, count))
+            toks = []
+            key = [kind]
+            count = 0
+        elif tok == ')':
+            if not frames:
+                raise ValueError
+            report.groups += 1
+            group = tuple(key)
+            name = groups.get(group)
+            if name is None:
+                value = engine.run(toks, backend)
+                name = groups[group] = f'#{len(values)}'
+                values[name] = value
+                ops[name] = count
+                report.evaluated += 1
+            else:
+                report.reused += 1
+                report.ops_saved += ops[name]
+            toks, key, count = frames.pop()
+            toks.append(values[name])
+            key.append(name)
+            count += ops[name]
+        elif tok in SYMBOLS:
+            toks.append(tok)
+            key.append(tok)
+            count += 1
+        else:
+            toks.append(number(tok))
+            key.append(tok)
+    if frames:
+        raise ValueError
+    return toks
+
+
+def fold(expr: str, backend=None, memo=None, report=None):
+    # returns (tokens for engine.run, FoldReport)
+    memo = FoldMemo() if memo is None else memo
+    report = FoldReport() if report is None else report
+    try:
+        if probe.on:
+            return timed('fold', _fold, expr, backend, memo, report), report
+        return _fold(expr, backend, memo, report), report
+    except (ValueError, KeyError, ArithmeticError):
+        # malformed input: let the engine raise its exact error
+        engine.run(engine.tokenize(expr, backend), backend)
+        raise
+
+
+def evaluate(expr: str, backend=None, memo=None, report=None):
+    toks, _ = fold(expr, backend, memo, report)
+    try:
+        return engine.run(toks, backend)
+    except ValueError:
+        engine.run(engine.tokenize(expr, backend), backend)
+        raise
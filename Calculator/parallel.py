@@ -0,0 +1,72 @@
+# parallel.py
+# Multi-core batch evaluation: the input is cut into chunks that are fanned
+# out to a process pool. Results come back in input order, and only a few
+# chunks per worker are in flight at once, so memory stays bounded.
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import batch
+import numeric
+
+
+def chunked(items, size):
+    it = iter(items)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run_chunk(mode, backend, chunk):
+    if backend is not None:
+        backend = numeric.get_backend(*backend)
+        if backend is numeric.FLOAT:
+            backend = None
+    evaluate = batch.get_evaluator(mode, backend=backend)
+    t0 = time.perf_counter()
+    records = list(batch.evaluate_stream(chunk, evaluate))
+    return os.getpid(), time.perf_counter() - t0, records
+
+
+def evaluate_parallel(items, mode='parens', workers=None, chunk_size=2000,
+                      stats=None, in_flight=4, backend=None):
+    # items are (lineno, expr) pairs as produced by batch.read_expressions;
+    # stats, if given, is filled with {pid: {'chunks', 'expressions', 'busy'}};
+    # backend is a (name, precision) pair for numeric.get_backend
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        chunks = chunked(items, chunk_size)
+        for chunk in chunks:
+            pending.append(pool.submit(_run_chunk, mode, backend, chunk))
+            if len(pending) >= workers * in_flight:
+                yield from _collect(pending.popleft(), stats)
+        while pending:
+            yield from _collect(pending.popleft(), stats)
+
+
+def _collect(future, stats):
+    pid, busy, records = future.result()
+    if stats is not None:
+        s = stats.setdefault(pid, {'chunks': 0, 'expressions': 0, 'busy': 0.0})
+        s['chunks'] += 1
+        s['expressions'] += len(records)
+        s['busy'] += busy
+    return records
+
+
+def format_stats(stats, wall):
+    lines = []
+    total = 0
+    for n, (pid, s) in enumerate(sorted(stats.items()), 1):
+        rate = s['expressions'] / s['busy'] if s['busy'] else 0.0
+        lines.append(f'worker {n} (pid {pid}): {s["chunks"]} chunks, '
+                     f'{s["expressions"]} expressions, {rate:,.0f} expr/s')
+        total += s['expressions']
+    rate = total / wall if wall else 0.0
+    lines.append(f'total: {total} expressions in {wall:.3f}s, {rate:,.0f} expr/s')
+    return lines
@@ -0,0 +1,81 @@
+# registers.py
+# Numbered memory registers for M/MR/MC and M+/M-. The registers are one
+# flat block of doubles: an array('d') for a session bank, or the same
+# layout mapped straight from a file for a persistent one, so a store is a
+# single 8-byte write and opening the bank reads nothing up front.
+import mmap
+import os
+from array import array
+
+DEFAULT_PATH = os.environ.get('CALC_MEMORY',
+                              os.path.join(os.path.expanduser('~'), '.calculator', 'memory.bin'))
+
+
+def label(register, value) -> str:
+    return f'M: {value}' if register == 0 else f'M{register}: {value}'
+
+
+class MemoryBank:
+    def __init__(self, size=100, path=None):
+        self.path = path
+        self._map = None
+        if path is None:
+            self._regs = array('d', bytes(8 * size))
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a+b') as f:
+            # a bank saved with more registers keeps them all
+            if os.fstat(f.fileno()).st_size < 8 * size:
+                f.truncate(8 * size)
+            self._map = mmap.mmap(f.fileno(), 0)
+        self._regs = memoryview(self._map)[:len(self._map) // 8 * 8].cast('d')
+
+    def __len__(self):
+        return len(self._regs)
+
+    def __getitem__(self, i: int) -> float:
+        return self._regs[i]
+
+    def __setitem__(self, i: int, value: float):
+        self._regs[i] = value
+
+    def store(self, i: int, value: float):
+        self._regs[i] = value
+
+    def recall(self, i: int) -> float:
+        return self._regs[i]
+
+    def add(self, i: int, value: float) -> float:
+        regs = self._regs
+        regs[i] += value
+        return regs[i]
+
+    def subtract(self, i: int, value: float) -> float:
+        regs = self._regs
+        regs[i] -= value
+        return regs[i]
+
+    def clear(self, i=None):
+        if i is None:
+            self._regs[:] = array('d', bytes(8 * len(self._regs)))
+        else:
+            self._regs[i] = 0.0
+
+    def flush(self):
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self._regs.release()
+            self._map.close()
+            self._map = None
+            self._regs = array('d')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
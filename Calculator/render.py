@@ -0,0 +1,70 @@
+# render.py
+# Coalesced rendering for the Tk front ends. Views (display, history,
+# memory, stack, operator highlight) are marked dirty with their new value
+# and painted together once per idle cycle through after_idle, so a burst
+# of input (paste, auto-repeat, scripted entry) costs one redraw.
+import time
+from collections import deque
+
+_UNSET = object()
+
+
+class Renderer:
+    def __init__(self, root, coalesce=True, history=1000):
+        self.root = root
+        self.coalesce = coalesce
+        self.views = {}
+        self.shown = {}
+        self.dirty = {}
+        self.flushes = 0
+        self.marks = 0
+        self.paints = 0
+        # input-to-paint latency of each flush, in seconds
+        self.latencies = deque(maxlen=history)
+        self._scheduled = None
+        self._first_mark = None
+        # called after every flush that painted, e.g. by monitor.Monitor
+        self.on_flush = None
+
+    def add_view(self, name, paint, shown=_UNSET):
+        self.views[name] = paint
+        if shown is not _UNSET:
+            self.shown[name] = shown
+
+    def mark(self, name, value):
+        self.marks += 1
+        if not self.dirty:
+            self._first_mark = time.perf_counter()
+        self.dirty[name] = value
+        if not self.coalesce:
+            self.flush()
+        elif self._scheduled is None:
+            self._scheduled = self.root.after_idle(self.flush)
+
+    def pending(self, name) -> bool:
+        return name in self.dirty
+
+    def flush(self):
+        if self._scheduled is not None:
+            if self.coalesce:
+                self.root.after_cancel(self._scheduled)
+            self._scheduled = None
+        if not self.dirty:
+            return
+        dirty, self.dirty = self.dirty, {}
+        shown = self.shown
+        for name, value in dirty.items():
+            if shown.get(name, _UNSET) != value:
+                self.views[name](value)
+                shown[name] = value
+                self.paints += 1
+        self.flushes += 1
+        self.latencies.append(time.perf_counter() - self._first_mark)
+        if self.on_flush is not None:
+            self.on_flush()
+
+    def stats(self) -> dict:
+        lat = sorted(self.latencies)
+        return {'marks': self.marks, 'flushes': self.flushes, 'paints': self.paints,
+                'p50': lat[len(lat) // 2] if lat else 0.0,
+                'max': lat[-1] if lat else 0.0}
@@ -0,0 +1,248 @@
+# rpn.py
+# GUI-free RPN machine. The stack is a contiguous array('d'); with a
+# capacity set it either refuses to grow (StackError) or, with spill=True,
+# moves its bottom half to a temporary file and reads it back on demand.
+# A non-float numeric backend (numeric.py) keeps its values in a list and
+# cannot spill.
+#   RPNMachine().run('3 4 + 2 *')  ->  14.0
+# The stack words follow Forth and count from the top, 0 being the top:
+#   DUP a-aa  DROP a-  SWAP ab-ba  OVER ab-aba  ROT abc-bca  DEPTH -n
+#   PICK n: copy item n to the top   ROLL n: move item n to the top
+#   DROPN n: drop n items
+# In a program n is popped from the stack first. All of them touch only
+# the top of the buffer, except ROLL, which is one memmove of n items.
+import math
+import tempfile
+from array import array
+
+from engine import OPS
+from instrument import probe, timed
+
+_ITEM = array('d').itemsize
+
+
+# word -> (method, takes n from the stack)
+WORDS = {'DUP': ('dup', False), 'DROP': ('drop', False), 'SWAP': ('swap', False),
+         'OVER': ('over', False), 'ROT': ('rot', False), 'DEPTH': ('push_depth', False),
+         'PICK': ('pick', True), 'ROLL': ('roll', True), 'DROPN': ('drop', True)}
+
+
+class StackError(ValueError):
+    pass
+
+
+class RPNMachine:
+    def __init__(self, capacity=None, spill=False, backend=None):
+        if capacity is not None and capacity < 2:
+            raise ValueError('capacity must be at least 2')
+        if backend is not None and backend.name == 'float':
+            backend = None
+        if spill and backend is not None:
+            raise ValueError(f'the {backend.name} backend cannot spill')
+        self.capacity = capacity
+        self.spill = spill and capacity is not None
+        self.number = float if backend is None else backend.number
+        self.ops = OPS if backend is None else backend.ops
+        self._new_stack = (lambda: array('d')) if backend is None else list
+        self.stack = self._new_stack()
+        self._spill_file = None
+        self._spilled = []   # item counts of the blocks written to the spill file
+
+    def __len__(self):
+        return len(self.stack) + sum(self._spilled)
+
+    @property
+    def depth(self) -> int:
+        return len(self)
+
+    def _spill_out(self):
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile()
+        n = self.capacity // 2
+        self._spill_file.seek(0, 2)
+        self.stack[:n].tofile(self._spill_file)
+        del self.stack[:n]
+        self._spilled.append(n)
+
+    def _spill_in(self):
+        n = self._spilled.pop()
+        f = self._spill_file
+        f.seek(-n * _ITEM, 2)
+        block = array('d')
+        block.fromfile(f, n)
+        f.seek(-n * _ITEM, 2)
+        f.truncate()
+        block.extend(self.stack)
+        self.stack = block
+
+    def _need(self, n):
+        while len(self.stack) < n and self._spilled:
+            self._spill_in()
+        if len(self.stack) < n:
+            raise StackError(f'Stack needs {n} value(s), has {len(self.stack)}')
+
+    def push(self, value: float):
+        if self.capacity is not None and len(self.stack) >= self.capacity:
+            if not self.spill:
+                raise StackError('Stack is full')
+            self._spill_out()
+        self.stack.append(value)
+
+    def pop(self) -> float:
+        if not self.stack:
+            self._need(1)
+        return self.stack.pop()
+
+    def top(self) -> float:
+        if not self.stack:
+            self._need(1)
+        return self.stack[-1]
+
+    def peek(self, n: int) -> list:
+        # the top n values, bottom first
+        if len(self.stack) < n and self._spilled:
+            self._need(min(n, len(self)))
+        return list(self.stack[-n:]) if n > 0 else []
+
+    def apply(self, op: str) -> float:
+        s = self.stack
+        if len(s) < 2:
+            self._need(2)
+            s = self.stack
+        result = self.ops[op](s[-2], s[-1])
+        del s[-1]
+        s[-1] = result
+        return result
+
+    def dup(self):
+        self.push(self.top())
+
+    def drop(self, n: int = 1):
+        if n < 0:
+            raise StackError('Count must not be negative')
+        if n:
+            self._need(n)
+            del self.stack[-n:]
+
+    def swap(self):
+        if len(self.stack) < 2:
+            self._need(2)
+        s = self.stack
+        s[-1], s[-2] = s[-2], s[-1]
+
+    def over(self):
+        if len(self.stack) < 2:
+            self._need(2)
+        self.push(self.stack[-2])
+
+    def rot(self):
+        if len(self.stack) < 3:
+            self._need(3)
+        s = self.stack
+        s[-3], s[-2], s[-1] = s[-2], s[-1], s[-3]
+
+    def push_depth(self):
+        # through the number text, which every backend reads
+        self.push(self.number(str(len(self))))
+
+    def pick(self, n: int):
+        if n < 0:
+            raise StackError('Index must not be negative')
+        self._need(n + 1)
+        self.push(self.stack[-1 - n])
+
+    def roll(self, n: int):
+        if n < 0:
+            raise StackError('Index must not be negative')
+        self._need(n + 1)
+        s = self.stack
+        if n:
+            value = s[-1 - n]
+            del s[-1 - n]
+            s.append(value)
+
+    def word(self, name: str, n=None):
+        method, counted = WORDS[name]
+        if not counted:
+            getattr(self, method)()
+            return
+        # n is checked against the stack before it is popped, so a failed
+        # PICK/ROLL/DROPN leaves the stack as it was
+        popped = n is None
+        if popped:
+            n = self.top()
+        if not math.isfinite(n) or n != int(n):
+            raise StackError(f'{name} needs a whole number')
+        n = int(n)
+        if n < 0:
+            raise StackError('Count must not be negative' if method == 'drop'
+                             else 'Index must not be negative')
+        need = n + (method != 'drop') + popped
+        if len(self) < need:
+            raise StackError(f'Stack needs {need} value(s), has {len(self)}')
+        if popped:
+            self.pop()
+        getattr(self, method)(n)
+
+    def clear(self):
+        self.stack = self._new_stack()
+        self._spilled.clear()
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def save(self):
+        # a copy of the whole stack, spilled blocks included, for restore()
+        spilled = b''
+        if self._spilled:
+            self._spill_file.seek(0)
+            spilled = self._spill_file.read()
+        return self.stack[:], self._spilled[:], spilled
+
+    def restore(self, saved):
+        stack, counts, spilled = saved
+        self.clear()
+        self.stack = stack[:]
+        self._spilled = counts[:]
+        if spilled:
+            self._spill_file = tempfile.TemporaryFile()
+            self._spill_file.write(spilled)
+
+    def run(self, program) -> float:
+        # program is a whitespace separated string or an iterable of tokens
+        if probe.on:
+            probe.count('evaluations')
+            return timed('rpn', self._run, program)
+        return self._run(program)
+
+    def _run(self, program):
+        if isinstance(program, str):
+            program = program.split()
+        ops = self.ops
+        number = self.number
+        s = self.stack
+        limit = self.capacity
+        for tok in program:
+            fn = ops.get(tok)
+            if fn is None:
+                try:
+                    value = number(tok)
+                except (TypeError, ValueError, ArithmeticError):
+                    # decimal and Fraction report bad text as ArithmeticError
+                    if tok not in WORDS:
+                        raise StackError(f'Unknown token {tok!r}') from None
+                    self.word(tok)
+                    s = self.stack
+                    continue
+                if limit is not None and len(s) >= limit:
+                    self.push(value)
+                    s = self.stack
+                else:
+                    s.append(value)
+            else:
+                if len(s) < 2:
+                    self._need(2)
+                    s = self.stack
+                s[-2] = fn(s[-2], s[-1])
+                del s[-1]
+        return self.top()
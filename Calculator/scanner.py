@@ -0,0 +1,52 @@
+# scanner.py
+# The shared tokenizer. Numbers may be written 12, 1.5, .5, 2. or 1e-3;
+# operators and brackets are single characters and whitespace is skipped.
+# scan() yields tokens one at a time and accepts str, bytes or any buffer
+# (bytearray, memoryview, mmap), which the regex reads in place, so a large
+# input is never copied or split into a token list.
+#   list(scan(b'2*(.5+1e1)'))  ->  [2.0, '*', '(', 0.5, '+', 10.0, ')']
+# Minus is always its own token; a minus where a value is expected is unary
+# and is applied by the parser (engine.run).
+import re
+
+NUMBER = r'(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?'
+SYMBOLS = frozenset('+-*/()')
+
+TOKEN = re.compile(NUMBER + r'|[+\-*/()]|\S')
+_BYTES_TOKEN = re.compile(NUMBER.encode() + rb'|[+\-*/()]|\S')
+_BYTES_SYMBOLS = {s.encode(): s for s in SYMBOLS}
+_STR_SYMBOLS = {s: s for s in SYMBOLS}
+
+
+def _unexpected(tok, pos):
+    if tok.__class__ is not str:
+        tok = bytes(tok).decode('latin-1')
+    return ValueError(f'Unexpected character {tok!r} at position {pos}')
+
+
+def scan(data, number=float):
+    # yields numbers (made by number) and symbol strings
+    if isinstance(data, str):
+        pattern, symbols, text = TOKEN, _STR_SYMBOLS, None
+    else:
+        pattern, symbols, text = _BYTES_TOKEN, _BYTES_SYMBOLS, bytes.decode
+    for m in pattern.finditer(data):
+        tok = m.group()
+        sym = symbols.get(tok)
+        if sym is not None:
+            yield sym
+            continue
+        try:
+            yield number(tok if text is None else text(tok, 'ascii'))
+        except (ValueError, UnicodeDecodeError, ArithmeticError):
+            raise _unexpected(tok, m.start()) from None
+
+
+def error_position(data, number=float):
+    # the ValueError scan() raises for data, or None if it scans cleanly
+    try:
+        for _ in scan(data, number):
+            pass
+    except ValueError as e:
+        return e
+    return None
@@ -0,0 +1,276 @@
+# server.py
+# Local evaluation service. One warm process answers newline-delimited JSON
+# requests over TCP on a loopback address or over a Unix socket.
+#   python server.py --port 9020          python server.py --unix /tmp/calc.sock
+# request:  {"id": 1, "expr": "2*(3+4)", "mode": "parens", "backend": "float"}
+#           {"id": 2, "op": "stats"}      {"id": 3, "op": "reset"}
+# reply:    {"id": 1, "result": 14.0}  or  {"id": 1, "error": "..."}
+# mode is one of batch.EVALUATORS or "rpn"; backend/precision as in numeric.py.
+# Requests from every connection share one bounded queue. The batcher takes
+# all that is queued (up to --batch) and evaluates it in one pass, so a
+# burst of small requests costs one wake-up. When the queue is full the
+# readers stop reading and the socket buffers push back on the clients.
+# Replies on a connection come back in request order. With CALC_STATS=1
+# the stats reply also carries the per-stage timers (instrument.py).
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import stat
+import sys
+import time
+from collections import OrderedDict, deque
+
+import batch
+import instrument
+import numeric
+import rpn
+
+MODES = sorted(batch.EVALUATORS) + ['rpn']
+def check_local(host):
+    for *_, addr in socket.getaddrinfo(host, None):
+        if not ipaddress.ip_address(addr[0]).is_loopback:
+            raise ValueError(f'{host} is not a loopback address')
+
+
+class Stats:
+    def __init__(self, window=10000):
+        self.started = time.monotonic()
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.latencies = deque(maxlen=window)   # queue-to-reply, seconds
+        self.done = deque(maxlen=window)        # completion times
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        lat = sorted(self.latencies)
+        done = self.done
+
+        def ms(q):
+            return lat[min(len(lat) - 1, int(q * len(lat)))] * 1e3 if lat else 0.0
+
+        recent = len(done) / (now - done[0]) if len(done) > 1 and now > done[0] else 0.0
+        uptime = now - self.started
+        return {'uptime': round(uptime, 3), 'connections': self.connections,
+                'requests': self.requests, 'errors': self.errors,
+                'batches': self.batches, 'largest_batch': self.largest_batch,
+                'mean_batch': round(self.requests / self.batches, 2) if self.batches else 0.0,
+                'rate': round(self.requests / uptime, 1) if uptime else 0.0,
+                'recent_rate': round(recent, 1),
+                'p50_ms': round(ms(0.50), 3), 'p95_ms': round(ms(0.95), 3),
+                'p99_ms': round(ms(0.99), 3)}
+
+
+class EvalServer:
+    def __init__(self, batch_size=256, queue_size=1024, max_evaluators=64):
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.max_evaluators = max_evaluators
+        self.queue = None
+        self.stats = Stats()
+        self._evaluators = OrderedDict()    # LRU; the key comes from clients
+        self._batcher = None
+
+    def evaluator(self, mode='parens', backend='float', precision=None):
+        key = (mode, backend, precision)
+        fn = self._evaluators.get(key)
+        if fn is not None:
+            self._evaluators.move_to_end(key)
+            return fn
+        if mode not in MODES:
+            raise ValueError(f'Unknown mode {mode!r}')
+        b = None if backend == 'float' else numeric.get_backend(backend, precision)
+        if mode == 'rpn':
+            fn = lambda expr: rpn.RPNMachine(backend=b).run(expr)
+        else:
+            fn = batch.get_evaluator(mode, use_cache=True, backend=b)
+        self._evaluators[key] = fn
+        if len(self._evaluators) > self.max_evaluators:
+            self._evaluators.popitem(last=False)
+        return fn
+
+    def evaluate(self, req) -> dict:
+        reply = {'id': req.get('id')}
+        try:
+            expr = req.get('expr')
+            if not isinstance(expr, str):
+                raise ValueError("Request needs an 'expr' string")
+            fn = self.evaluator(req.get('mode', 'parens'), req.get('backend', 'float'),
+                                req.get('precision'))
+            value = fn(expr)
+            reply['result'] = value if value.__class__ in (float, int) else str(value)
+        except Exception as e:
+            # anything a request can raise is that request's error; letting
+            # it escape would stop the batcher and hang every later request
+            reply['error'] = str(e) or type(e).__name__
+            self.stats.errors += 1
+        return reply
+
+    def _run_batch(self, items):
+        stats = self.stats
+        evaluate = self.evaluate
+        for req, fut, _ in items:
+            if not fut.done():
+                fut.set_result(evaluate(req))
+        now = time.perf_counter()
+        latencies = stats.latencies
+        for _, _, t0 in items:
+            latencies.append(now - t0)
+        stats.done.extend([time.monotonic()] * len(items))
+        stats.requests += len(items)
+        stats.batches += 1
+        stats.largest_batch = max(stats.largest_batch, len(items))
+
+    async def _batch_loop(self):
+        q = self.queue
+        while True:
+            items = [await q.get()]
+            if q.empty():
+                # let the other readers queue what they already have
+                await asyncio.sleep(0)
+            while len(items) < self.batch_size and not q.empty():
+                items.append(q.get_nowait())
+            try:
+                self._run_batch(items)
+            except Exception as e:
+                print(f'batch failed: {e!r}', file=sys.stderr)
+                for _, fut, _ in items:
+                    if not fut.done():
+                        fut.set_result({'id': None, 'error': 'Internal error'})
+
+    async def _send(self, replies, writer):
+        try:
+            while True:
+                fut = await replies.get()
+                if fut is None:
+                    break
+                writer.write((json.dumps(await fut) + '\n').encode())
+                if replies.empty():
+                    await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _reply_later(self, replies, sender, item) -> bool:
+        # queues item for the sender; False once the sender has stopped, as
+        # a full queue would then never drain
+        if sender.done():
+            return False
+        try:
+            replies.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            pass
+        put = asyncio.ensure_future(replies.put(item))
+        await asyncio.wait((put, sender), return_when=asyncio.FIRST_COMPLETED)
+        if put.done():
+            return True
+        put.cancel()
+        return False
+
+    async def handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        self.stats.connections += 1
+        replies = asyncio.Queue(self.queue_size)
+        sender = asyncio.ensure_future(self._send(replies, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    # line over the limit, or the client went away
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                fut = loop.create_future()
+                if not await self._reply_later(replies, sender, fut):
+                    break
+                try:
+                    req = json.loads(line)
+                    if not isinstance(req, dict):
+                        raise ValueError
+                except ValueError:
+                    fut.set_result({'id': None, 'error': 'Bad request'})
+                    continue
+                if req.get('op') == 'stats':
+                    reply = {'id': req.get('id'), 'stats': self.stats.snapshot()}
+                    if instrument.probe.on:
+                        reply['stages'] = instrument.stats()
+                    fut.set_result(reply)
+                    continue
+                if req.get('op') == 'reset':
+                    instrument.reset()
+                    fut.set_result({'id': req.get('id'), 'reset': True})
+                    continue
+                await self.queue.put((req, fut, time.perf_counter()))
+        finally:
+            if await self._reply_later(replies, sender, None):
+                await sender
+            elif not sender.cancelled() and sender.exception() is not None:
+                print(f'sender failed: {sender.exception()!r}', file=sys.stderr)
+            writer.close()
+            self.stats.connections -= 1
+
+    async def start(self, host='127.0.0.1', port=9020, unix=None, limit=2 ** 20):
+        self.queue = asyncio.Queue(self.queue_size)
+        self._batcher = asyncio.ensure_future(self._batch_loop())
+        if unix is not None:
+            try:
+                mode = os.lstat(unix).st_mode
+            except FileNotFoundError:
+                pass
+            else:
+                # a stale socket from an earlier run; never remove anything else
+                if not stat.S_ISSOCK(mode):
+                    raise ValueError(f'{unix} exists and is not a socket')
+                os.unlink(unix)
+            return await asyncio.start_unix_server(self.handle, unix, limit=limit)
+        check_local(host)
+        return await asyncio.start_server(self.handle, host, port, limit=limit)
+
+
+async def serve(args):
+    server = EvalServer(args.batch, args.queue)
+    listener = await server.start(args.host, args.port, args.unix, args.max_line)
+    where = args.unix or '%s:%d' % listener.sockets[0].getsockname()[:2]
+    print(f'listening on {where}', flush=True)
+    if args.stats_every:
+        async def report():
+            while True:
+                await asyncio.sleep(args.stats_every)
+                print(json.dumps(server.stats.snapshot()), file=sys.stderr, flush=True)
+        asyncio.ensure_future(report())
+    async with listener:
+        await listener.serve_forever()
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description='Serve calculator evaluations as JSON lines.')
+    p.add_argument('--host', default='127.0.0.1', help='loopback address to listen on')
+    p.add_argument('--port', type=int, default=9020, help='TCP port (0 = any free port)')
+    p.add_argument('--unix', default=None, help='listen on this Unix socket instead')
+    p.add_argument('--batch', type=int, default=256, help='most requests evaluated per pass')
+    p.add_argument('--queue', type=int, default=1024,
+                   help='requests queued before readers stop reading')
+    p.add_argument('--max-line', type=int, default=2 ** 20, help='longest request in bytes')
+    p.add_argument('--stats-every', type=float, default=0,
+                   help='print stats to stderr every N seconds')
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    try:
+        asyncio.run(serve(parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
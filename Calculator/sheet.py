@@ -0,0 +1,186 @@
+# sheet.py
+# A small worksheet: named inputs and formulas that refer to each other.
+#   s = Sheet();  s.set('rate', 0.2);  s.define('tax', 'price*rate')
+#   s.set('price', 50)  -> ['price', 'tax'];  s['tax'] -> 10.0
+# Formulas are compiled once by formula.py and linked into a dependency
+# graph. Changing a cell recomputes only the cells downstream of it, in
+# topological order, so an update costs time proportional to the affected
+# subgraph however large the sheet is. A cycle is refused when defined.
+# Inputs are stored as floats. A formula whose inputs are missing or fail,
+# or whose arithmetic fails, has no value and the reason is kept in errors;
+# a recompute always runs to the end.
+#   python sheet.py [file]   reads 'name = expression' lines and prints
+#                            every cell each line changes
+import keyword
+import re
+import sys
+
+import formula
+
+_NAME = re.compile(r'[A-Za-z_]\w*')
+_ASSIGN = re.compile(r'\s*([A-Za-z_]\w*)\s*=(.*)')
+
+
+def _check_name(name):
+    if not _NAME.fullmatch(name) or keyword.iskeyword(name):
+        raise ValueError(f'Invalid name {name!r}')
+
+
+class Sheet:
+    def __init__(self):
+        self.values = {}
+        self.errors = {}
+        self.formulas = {}
+        self.users = {}     # name -> set of formula cells that read it
+
+    def __contains__(self, name):
+        return name in self.values
+
+    def __getitem__(self, name):
+        if self.values.get(name) is None:
+            raise KeyError(self.errors.get(name, name))
+        return self.values[name]
+
+    def get(self, name, default=None):
+        value = self.values.get(name)
+        return default if value is None else value
+
+    def set(self, name, value) -> list:
+        # an input cell; a formula of the same name is replaced
+        _check_name(name)
+        try:
+            value = float(value)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f'Invalid value for {name!r}: {value!r:.40}') from None
+        self._unlink(name)
+        self.values[name] = value
+        self.errors.pop(name, None)
+        return self._recompute(name)
+
+    def define(self, name, expr) -> list:
+        _check_name(name)
+        fn = formula.compile_formula(expr)
+        if name in fn.names or self._reaches(name, fn.names):
+            raise ValueError(f'Circular reference in {name!r}')
+        self._unlink(name)
+        self.formulas[name] = fn
+        for dep in fn.names:
+            self.users.setdefault(dep, set()).add(name)
+        return self._recompute(name)
+
+    def remove(self, name) -> list:
+        self._unlink(name)
+        self.values.pop(name, None)
+        self.errors.pop(name, None)
+        changed = self._recompute(name)
+        return changed[1:]
+
+    def assign(self, line) -> list:
+        # 'name = expression'; a bare number makes an input cell
+        m = _ASSIGN.match(line)
+        if not m:
+            raise ValueError("Expected 'name = expression'")
+        name, expr = m.group(1), m.group(2).strip()
+        try:
+            value = float(expr)
+        except ValueError:
+            return self.define(name, expr)
+        return self.set(name, value)
+
+    def formula_of(self, name):
+        fn = self.formulas.get(name)
+        return None if fn is None else fn.expression
+
+    def _unlink(self, name):
+        fn = self.formulas.pop(name, None)
+        if fn is not None:
+            for dep in fn.names:
+                self.users[dep].discard(name)
+
+    def _reaches(self, start, targets):
+        # True if any of targets is downstream of start
+        targets = set(targets)
+        seen = {start}
+        stack = [start]
+        while stack:
+            for user in self.users.get(stack.pop(), ()):
+                if user in targets:
+                    return True
+                if user not in seen:
+                    seen.add(user)
+                    stack.append(user)
+        return False
+
+    def _recompute(self, name) -> list:
+        # Kahn's algorithm over the cells downstream of name only
+        pending = {name: 0}
+        stack = [name]
+        while stack:
+            for user in self.users.get(stack.pop(), ()):
+                if user in pending:
+                    pending[user] += 1
+                else:
+                    pending[user] = 1
+                    stack.append(user)
+        order = []
+        ready = [name]
+        while ready:
+            cell = ready.pop()
+            order.append(cell)
+            if cell in self.formulas:
+                self._evaluate(cell)
+            for user in self.users.get(cell, ()):
+                pending[user] -= 1
+                if not pending[user]:
+                    ready.append(user)
+        return order
+
+    def _evaluate(self, name):
+        fn = self.formulas[name]
+        args = []
+        for dep in fn.names:
+            value = self.values.get(dep)
+            if value is None:
+                self.values[name] = None
+                self.errors[name] = f'{dep} has no value'
+                return
+            args.append(value)
+        try:
+            self.values[name] = fn(*args)
+        except ZeroDivisionError:
+            self.values[name] = None
+            self.errors[name] = 'Division by zero'
+        except (ArithmeticError, TypeError) as exc:
+            self.values[name] = None
+            self.errors[name] = f'{type(exc).__name__}: {exc}'
+        else:
+            self.errors.pop(name, None)
+
+    def show(self, name) -> str:
+        value = self.values.get(name)
+        return f'{name} = {self.errors.get(name, "?") if value is None else value}'
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    src = open(argv[0], encoding='utf-8') if argv and argv[0] != '-' else sys.stdin
+    sheet = Sheet()
+    try:
+        for line in src:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                changed = sheet.assign(line)
+            except ValueError as exc:
+                print(f'error: {exc}', file=sys.stderr)
+                continue
+            for name in changed:
+                print(sheet.show(name))
+    finally:
+        if src is not sys.stdin:
+            src.close()
+
+
+if __name__ == '__main__':
+    main()
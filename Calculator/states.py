@@ -0,0 +1,668 @@
+# states.py
+# Tk-independent state machines for the three calculator modes. Each takes
+# key presses (the button labels) and returns a Snapshot of what the front
+# end should show, so the logic can run and be load-tested without a
+# display. The App/Calculator classes only render snapshots.
+import re
+from array import array
+from collections import namedtuple
+
+import cache
+import registers
+import rpn
+from engine import OPS
+
+# stack is the RPN stack label text, None for the other modes; memory is
+# the value of the selected register; preview is the bracket mode's value of
+# the whole expression while brackets are open, None otherwise
+Snapshot = namedtuple('Snapshot', 'display history memory highlight stack register preview',
+                      defaults=(0, None))
+
+DIGITS = '0123456789.'
+# M+/M- accumulate the display into the selected register; Reg selects the
+# register numbered by the display
+MEMORY_KEYS = ('M+', 'M-', 'Reg')
+# keyboard shortcuts for the RPN stack words
+STACK_KEYS = {'d': 'DUP', 'x': 'DROP', 's': 'SWAP', 'o': 'OVER', 'r': 'ROT',
+              'l': 'ROLL', 'p': 'PICK', 'X': 'DROPN', '#': 'DEPTH'}
+SEPARATORS = '+-*/()'
+_SEPARATOR = re.compile(r'[+\-*/()]')
+
+
+class _State:
+    # keyboard: keysym -> button, then typed character -> button
+    KEYS = {'Escape': 'C'}
+    CHARS = {c: c for c in DIGITS + '+-*/'}
+
+    def __init__(self, bank=None):
+        self.display = ''
+        self.history = ''
+        self.bank = bank if bank is not None else registers.MemoryBank()
+        self.register = 0
+        self.highlighted_op = None
+        self.ready_for_new_input = False
+        # called as on_result(expression, value) whenever '=' gives a result
+        self.on_result = None
+
+    @property
+    def memory(self) -> float:
+        return self.bank[self.register]
+
+    @memory.setter
+    def memory(self, value):
+        self.bank[self.register] = value
+
+    def _memory_operand(self):
+        try:
+            return float(self.display.strip())
+        except ValueError:
+            return None
+
+    def _memory_key(self, ch):
+        value = self._memory_operand()
+        if value is None:
+            return
+        if ch == 'M+':
+            self.bank.add(self.register, value)
+        elif ch == 'M-':
+            self.bank.subtract(self.register, value)
+        elif value.is_integer() and 0 <= value < len(self.bank):
+            self.register = int(value)
+            self.ready_for_new_input = True
+
+    def _result(self, expression, value):
+        if self.on_result is not None:
+            self.on_result(expression, value)
+
+    def snapshot(self) -> Snapshot:
+        return Snapshot(self.display, self.history, self.memory,
+                        self.highlighted_op, None, self.register)
+
+    def key_button(self, char, keysym):
+        # the button a key press stands for, or None
+        return self.KEYS.get(keysym) or self.CHARS.get(char)
+
+    def recall(self, value) -> Snapshot:
+        # put a past result on the display as if it had just been typed
+        self.display = f'{value:.10g}'
+        self.ready_for_new_input = True
+        return self.snapshot()
+
+    def press(self, ch: str) -> Snapshot:
+        self._press(ch)
+        return self.snapshot()
+
+    def feed(self, keys) -> Snapshot:
+        # many keys, one snapshot at the end
+        press = self._press
+        for ch in keys:
+            press(ch)
+        return self.snapshot()
+
+
+class InfixState(_State):
+    KEYS = {'Return': '=', 'KP_Enter': '=', 'Escape': 'C'}
+    CHARS = dict(_State.CHARS, **{'=': '='})
+
+    def __init__(self, bank=None):
+        super().__init__(bank)
+        self.last_operator = None
+        self.operand = None
+        self.just_calculated = False
+
+    def _press(self, ch):
+        if ch in DIGITS:
+            if self.ready_for_new_input or self.just_calculated:
+                self.display = ''
+                self.ready_for_new_input = False
+                self.just_calculated = False
+                if not self.last_operator:
+                    self.highlighted_op = None
+                    self.history = ''
+            self.display += ch
+
+        elif ch in OPS:
+            try:
+                current_value = float(self.display) if self.display else 0
+                if self.operand is not None and self.last_operator:
+                    result = OPS[self.last_operator](self.operand, current_value)
+                    self.operand = result
+                    self.display = f'{result:.10g}'
+                else:
+                    self.operand = current_value
+                self.history = f'{self.operand} {ch}'
+                self.last_operator = ch
+                self.ready_for_new_input = True
+                self.highlighted_op = ch
+            except (ValueError, ZeroDivisionError):
+                self.display = 'Error'
+                self._clear_state()
+
+        elif ch == '=':
+            try:
+                if self.operand is not None and self.last_operator:
+                    current_value = float(self.display) if self.display else 0
+                    result = OPS[self.last_operator](self.operand, current_value)
+                    self.display = f'{result:.10g}'
+                    self.history = f'{self.operand} {self.last_operator} {current_value} = {result:.10g}'
+                    self._result(f'{self.operand} {self.last_operator} {current_value}', result)
+                    self.operand = result
+                    self.last_operator = None
+                    self.just_calculated = True
+                    self.highlighted_op = None
+            except (ValueError, ZeroDivisionError):
+                self.display = 'Error'
+                self._clear_state()
+
+        elif ch == 'C':
+            self.display = ''
+            self._clear_state()
+
+        elif ch == 'MC':
+            self.memory = 0.0
+
+        elif ch == 'MR':
+            self.display = f'{self.memory:.10g}'
+            self.just_calculated = True
+
+        elif ch == 'M':
+            try:
+                if self.display and self.display != 'Error':
+                    self.memory = float(self.display)
+            except ValueError:
+                pass
+
+        elif ch in MEMORY_KEYS:
+            self._memory_key(ch)
+
+    def paste(self, text) -> Snapshot:
+        # a whole pasted expression, evaluated left to right in one call;
+        # its value becomes the current entry, like MR
+        text = ' '.join(text.split())
+        if not text:
+            return self.snapshot()
+        try:
+            value = float(cache.shared.evaluate(text, 'left2right'))
+        except (ValueError, KeyError, ArithmeticError):
+            # rejected; the expression in progress is kept
+            return self.snapshot()
+        if not self.last_operator:
+            self.history = f'{text} = {value:.10g}'
+        return self.recall(value)
+
+    def _clear_state(self):
+        self.operand = None
+        self.last_operator = None
+        self.ready_for_new_input = False
+        self.just_calculated = False
+        self.highlighted_op = None
+        self.history = ''
+
+
+class RPNState(_State):
+    KEYS = {'Return': 'EN', 'KP_Enter': 'EN', 'space': 'EN', 'Escape': 'C'}
+    CHARS = dict(_State.CHARS, **STACK_KEYS)
+
+    def __init__(self, vm=None, bank=None):
+        super().__init__(bank)
+        self.vm = vm if vm is not None else rpn.RPNMachine()
+
+    def stack_text(self) -> str:
+        depth = len(self.vm)
+        if not depth:
+            return 'Stack: []'
+        stack_str = ' '.join([f'{x:.6g}' for x in self.vm.peek(3)])
+        if depth > 3:
+            stack_str = '... ' + stack_str
+        return f'Stack: [{stack_str}]'
+
+    def snapshot(self) -> Snapshot:
+        return Snapshot(self.display, self.history, self.memory,
+                        self.highlighted_op, self.stack_text(), self.register)
+
+    def paste(self, text) -> Snapshot:
+        # a whole pasted program runs on the stack in one call; a number
+        # being typed is entered first. A rejected program leaves the stack
+        # and the entry as they were, like a rejected infix paste
+        program = text.upper().split()
+        if not program:
+            return self.snapshot()
+        vm = self.vm
+        saved = vm.save()
+        current = self.display.strip()
+        try:
+            if current and not self.ready_for_new_input:
+                vm.push(float(current))
+            vm.run(program)
+        except (ValueError, ArithmeticError):
+            vm.restore(saved)
+            return self.snapshot()
+        self.display = ''
+        self.ready_for_new_input = True
+        self.highlighted_op = None
+        return self.snapshot()
+
+    def _memory_operand(self):
+        # like M, fall back to the top of the stack
+        value = super()._memory_operand()
+        if value is None and not self.display.strip() and len(self.vm):
+            value = self.vm.top()
+        return value
+
+    def _press(self, ch):
+        vm = self.vm
+        if ch in DIGITS:
+            if self.ready_for_new_input:
+                self.display = ''
+                self.ready_for_new_input = False
+                self.highlighted_op = None
+            self.display += ch
+
+        elif ch in OPS:
+            if len(vm) == 0:
+                return
+            current = self.display.strip()
+            if current:
+                try:
+                    vm.push(float(current))
+                    self.display = ''
+                except ValueError:
+                    return
+            if len(vm) >= 2:
+                try:
+                    result = vm.apply(ch)
+                    self.display = f'{result:.6g}'
+                    self.ready_for_new_input = True
+                    self.highlighted_op = ch
+                except (ZeroDivisionError, ValueError):
+                    self.display = 'Error'
+                    vm.clear()
+                    self.highlighted_op = None
+
+        elif ch == 'EN':
+            current = self.display.strip()
+            if current and current != 'Error':
+                try:
+                    vm.push(float(current))
+                    self.display = ''
+                    self.ready_for_new_input = True
+                except ValueError:
+                    pass
+            self.highlighted_op = None
+
+        elif ch in rpn.WORDS:
+            # a number being typed is pushed first, or is n for PICK/ROLL/DROPN
+            n = None
+            current = self.display.strip()
+            if current and not self.ready_for_new_input:
+                try:
+                    value = float(current)
+                except ValueError:
+                    return
+                if rpn.WORDS[ch][1]:
+                    n = value
+                else:
+                    vm.push(value)
+                    self.display = ''
+            try:
+                vm.word(ch, n)
+            except (rpn.StackError, OverflowError):
+                return
+            self.display = ''
+            self.ready_for_new_input = True
+            self.highlighted_op = None
+
+        elif ch == 'C':
+            self.display = ''
+            vm.clear()
+            self.ready_for_new_input = False
+            self.highlighted_op = None
+
+        elif ch == 'MC':
+            self.memory = 0.0
+            self.highlighted_op = None
+
+        elif ch == 'MR':
+            self.display = f'{self.memory:.6g}'
+            self.ready_for_new_input = True
+            self.highlighted_op = None
+
+        elif ch == 'M':
+            try:
+                current_val = self.display.strip()
+                if current_val and current_val != 'Error':
+                    self.memory = float(current_val)
+                elif len(vm):
+                    self.memory = vm.top()
+            except (ValueError, IndexError):
+                pass
+            self.highlighted_op = None
+
+        elif ch in MEMORY_KEYS:
+            self._memory_key(ch)
+            self.highlighted_op = None
+
+
+# a op x as a Mobius map (p*x + q) / (r*x + s); these compose in O(1)
+IDENTITY = (1.0, 0.0, 0.0, 1.0)
+
+
+def _mobius(a, op):
+    if op == '+':
+        return (1.0, a, 0.0, 1.0)
+    if op == '-':
+        return (-1.0, a, 0.0, 1.0)
+    if op == '*':
+        return (a, 0.0, 0.0, 1.0)
+    return (0.0, a, 1.0, 0.0)
+
+
+def _compose(m, g):
+    p, q, r, s = m
+    e, f, g_, h = g
+    c = (p * e + q * g_, p * f + q * h, r * e + s * g_, r * f + s * h)
+    # projective, so rescale to keep the coefficients in range
+    scale = max(abs(x) for x in c) or 1.0
+    return tuple(x / scale for x in c)
+
+
+# an open bracket's frame packs into one byte: the pending operator's
+# index, plus _NO_OPERAND when there was no operand; the operands sit in an
+# array('d'), so closing or clearing any depth frees two flat buffers
+_FRAME_OPS = (None, '+', '-', '*', '/')
+_FRAME_CODES = {op: i for i, op in enumerate(_FRAME_OPS)}
+_NO_OPERAND = 8
+
+
+class BracketState(_State):
+    KEYS = {'Return': '=', 'KP_Enter': '=', 'Escape': 'AC', 'Delete': 'C',
+            'BackSpace': 'Del'}
+    CHARS = dict(_State.CHARS, **{'=': '=', '(': '(', ')': ')'})
+
+    # The expression text is kept as a list of parts whose last part is the
+    # number being typed, so digits cost O(1) instead of a backwards rescan.
+    # The parts before the last are also kept joined in _prefix, grown only
+    # when a part is finished, so a snapshot's history is one concatenation.
+    # Each open bracket also stores the composed map from its value to the
+    # value of the whole expression, which gives the live preview in O(1);
+    # '=' still unwinds the brackets exactly, so the result is unchanged.
+    def __init__(self, bank=None):
+        self._parts = []
+        self._prefix = ''
+        self._history_tail = None
+        super().__init__(bank)
+        self.last_operator = None
+        self.operand = None
+        self.just_calculated = False
+        self.bracket_stack = bytearray()
+        self._operands = array('d')
+        self._chain = array('d')    # 4 coefficients per open bracket
+        self.in_bracket = False
+        self.bracket_result_ready = False
+        self.pending_bracket_result = None
+
+    @property
+    def current_expression(self) -> str:
+        return self._prefix + self._parts[-1] if self._parts else ''
+
+    @property
+    def history(self) -> str:
+        if self._history_tail is None:
+            return self._history_text
+        return self._prefix[:self._history_len] + self._history_last + self._history_tail
+
+    @history.setter
+    def history(self, text):
+        self._history_text = text
+        self._history_tail = None
+
+    def _show_expression(self, tail=''):
+        # history shows the expression as it is now; later digits only
+        # append parts or replace the last one, so keep its length and tail
+        self._history_tail = tail
+        self._history_len = len(self._prefix)
+        self._history_last = self._parts[-1] if self._parts else ''
+
+    def _push_frame(self):
+        operand, op = self.operand, self.last_operator
+        self.bracket_stack.append(_FRAME_CODES[op] | (_NO_OPERAND if operand is None else 0))
+        self._operands.append(0.0 if operand is None else operand)
+        g = IDENTITY if operand is None or not op else _mobius(operand, op)
+        self._chain.extend(_compose(self._chain[-4:], g) if self._chain else g)
+
+    def _pop_frame(self):
+        # restores the operand and operator from before the bracket
+        code = self.bracket_stack.pop()
+        operand = self._operands.pop()
+        del self._chain[-4:]
+        self.operand = None if code & _NO_OPERAND else operand
+        self.last_operator = _FRAME_OPS[code & 7]
+
+    def _clear_frames(self):
+        self.bracket_stack = bytearray()
+        self._operands = array('d')
+        self._chain = array('d')
+
+    def _append_part(self, part):
+        parts = self._parts
+        if parts:
+            prefix = self._prefix
+            self._prefix = None
+            # the only reference, so CPython can grow the string in place
+            prefix += parts[-1]
+            self._prefix = prefix
+        parts.append(part)
+
+    def _set_parts(self, parts):
+        self._parts = parts
+        self._prefix = ''.join(parts[:-1])
+
+    def snapshot(self) -> Snapshot:
+        return Snapshot(self.display, self.history, self.memory, self.highlighted_op,
+                        None, self.register,
+                        self.live_value() if self.bracket_stack else None)
+
+    def live_value(self):
+        # value of the whole expression if it were closed now; the outer
+        # brackets are applied through the composed map, so this can differ
+        # from '=' in the last bits and is only shown as a preview
+        try:
+            if self.bracket_result_ready:
+                value = self.pending_bracket_result
+            else:
+                value = float(self.display) if self.display else 0
+            if self.operand is not None and self.last_operator:
+                value = OPS[self.last_operator](self.operand, value)
+            if not self._chain:
+                return value
+            p, q, r, s = self._chain[-4:]
+            return (p * value + q) / (r * value + s)
+        except (ValueError, ZeroDivisionError, OverflowError):
+            return None
+
+    def _press(self, char):
+        if char in DIGITS:
+            if self.ready_for_new_input or self.just_calculated or self.bracket_result_ready:
+                self.display = ''
+                self.ready_for_new_input = False
+                self.just_calculated = False
+                self.bracket_result_ready = False
+                if not self.in_bracket and not self.last_operator:
+                    self.highlighted_op = None
+                    self.history = ''
+            self.display += char
+
+            parts = self._parts
+            if not parts or parts[-1][-1] in '+-*/(':
+                self._append_part(char)
+            elif parts[-1][-1] == ')':
+                self._append_part(self.display)
+            else:
+                parts[-1] = self.display
+            if len(parts[-1]) > 1 and _SEPARATOR.search(parts[-1]):
+                # text typed straight into the entry; split it again
+                self.history = self.history
+                expr = self.current_expression
+                i = max(expr.rfind(c) for c in SEPARATORS)
+                self._set_parts([expr[:i+1], expr[i+1:]] if expr[i+1:] else [expr])
+
+        elif char == '(':
+            if self.bracket_result_ready:
+                current_value = self.pending_bracket_result
+            else:
+                current_value = float(self.display) if self.display else 0
+            self._push_frame()
+            self.operand = None
+            self.last_operator = None
+            self.ready_for_new_input = True
+            self.in_bracket = True
+            self.bracket_result_ready = False
+            self.pending_bracket_result = None
+            if not self._parts:
+                self._append_part(str(current_value))
+            self._append_part('(')
+            self._show_expression()
+
+        elif char == ')':
+            if not self.bracket_stack:
+                return
+            current_value = float(self.display) if self.display else 0
+            if self.operand is not None and self.last_operator:
+                bracket_result = OPS[self.last_operator](self.operand, current_value)
+            else:
+                bracket_result = current_value
+            self._pop_frame()
+            self.display = f'{bracket_result:.10g}'
+            self._append_part(')')
+            self._show_expression()
+            self.pending_bracket_result = bracket_result
+            self.bracket_result_ready = True
+            self.ready_for_new_input = False
+            if not self.bracket_stack:
+                self.in_bracket = False
+
+        elif char in OPS:
+            try:
+                if self.bracket_result_ready:
+                    current_value = self.pending_bracket_result
+                    self.bracket_result_ready = False
+                    self.pending_bracket_result = None
+                else:
+                    current_value = float(self.display) if self.display else 0
+                if self.operand is not None and self.last_operator:
+                    result = OPS[self.last_operator](self.operand, current_value)
+                    self.operand = result
+                    self.display = f'{result:.10g}'
+                else:
+                    self.operand = current_value
+                self.last_operator = char
+                self.ready_for_new_input = True
+                if not self._parts:
+                    self._append_part(str(self.operand))
+                self._append_part(char)
+                self._show_expression()
+                self.highlighted_op = char
+            except (ValueError, ZeroDivisionError):
+                self.display = 'Error'
+                self._clear_state()
+
+        elif char == '=':
+            try:
+                if self.bracket_result_ready:
+                    current_value = self.pending_bracket_result
+                    self.bracket_result_ready = False
+                    self.pending_bracket_result = None
+                else:
+                    current_value = float(self.display) if self.display else 0
+                result = None
+                while self.bracket_stack:
+                    if self.operand is not None and self.last_operator:
+                        bracket_result = OPS[self.last_operator](self.operand, current_value)
+                    else:
+                        bracket_result = current_value
+                    self._pop_frame()
+                    current_value = bracket_result
+                if self.operand is not None and self.last_operator:
+                    result = OPS[self.last_operator](self.operand, current_value)
+                if result is not None:
+                    self.display = f'{result:.10g}'
+                    self._show_expression(f' = {result:.10g}')
+                    self._result(self.current_expression, result)
+                    self.operand = result
+                    self.last_operator = None
+                    self.just_calculated = True
+                self.in_bracket = False
+                self.highlighted_op = None
+            except (ValueError, ZeroDivisionError):
+                self.display = 'Error'
+                self._clear_state()
+
+        elif char == 'C':
+            self.display = ''
+
+        elif char == 'AC':
+            self.display = ''
+            self._clear_state()
+
+        elif char == 'Del':
+            self.display = self.display[:-1]
+
+        elif char == 'M':
+            try:
+                current_val = self.display.strip()
+                if current_val and current_val not in ['Error', 'Invalid']:
+                    self.memory = float(current_val)
+            except ValueError:
+                pass
+
+        elif char == 'MR':
+            self.display = f'{self.memory:.10g}'
+            self.just_calculated = True
+
+        elif char == 'MC':
+            self.memory = 0.0
+
+        elif char in MEMORY_KEYS:
+            self._memory_key(char)
+
+    def paste(self, text) -> Snapshot:
+        # a whole pasted expression goes to the engine in one call; its
+        # value becomes the current entry, like MR, in place of a closed
+        # bracket's or the last result
+        text = ' '.join(text.split())
+        if not text:
+            return self.snapshot()
+        try:
+            value = float(cache.shared.evaluate(text))
+        except (ValueError, ArithmeticError):
+            # rejected; the expression in progress is kept
+            return self.snapshot()
+        self.bracket_result_ready = False
+        self.pending_bracket_result = None
+        self.just_calculated = False
+        if not self.last_operator and not self.bracket_stack:
+            self.history = f'{text} = {value:.10g}'
+            self._set_parts([f'{value:.10g}'])
+        else:
+            # mid-expression the value stands where a typed number would
+            parts = self._parts
+            if parts and parts[-1][-1] not in '+-*/()':
+                parts[-1] = f'{value:.10g}'
+            else:
+                self._append_part(f'{value:.10g}')
+            self._show_expression()
+        return self.recall(value)
+
+    def _clear_state(self):
+        self.operand = None
+        self.last_operator = None
+        self.ready_for_new_input = False
+        self.just_calculated = False
+        self._clear_frames()
+        self._parts = []
+        self._prefix = ''
+        self.in_bracket = False
+        self.bracket_result_ready = False
+        self.pending_bracket_result = None
+        self.highlighted_op = None
+        self.history = ''
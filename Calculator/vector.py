@@ -0,0 +1,166 @@
+# vector.py
+# Evaluates one expression template over whole columns of operands, e.g.
+#   values, mask = evaluate_columns('a*b-c/d', a=A, b=B, c=C, d=D)
+# with the same left-to-right semantics as left2right and parenthesised
+# groups; a minus where a value is expected negates the next value or group,
+# as in the engine. Uses NumPy when it is installed and array('d') buffers otherwise.
+# Division by zero does not raise: those rows are NaN and flagged in mask.
+import math
+from array import array
+from functools import lru_cache
+import re
+
+from engine import OPS
+from scanner import NUMBER
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_TOKEN = re.compile(r'[A-Za-z_]\w*|' + NUMBER + r'|[+\-*/()]|\S')
+
+
+def compile_template(template: str):
+    # postfix code: names are loaded from the columns, floats are constants,
+    # 'neg' negates the top of the stack
+    code = []
+    names = []
+    frames = []
+    op = None
+    want_value = True
+    negate = False
+    for tok in _TOKEN.findall(template):
+        if tok in OPS:
+            if want_value:
+                if tok != '-' or negate:
+                    raise ValueError(f'Unexpected operator {tok!r}')
+                negate = True
+                continue
+            op = tok
+            want_value = True
+        elif tok == '(':
+            if not want_value:
+                raise ValueError('Missing operator')
+            frames.append((op, negate))
+            op = None
+            negate = False
+        elif tok == ')':
+            if not frames:
+                raise ValueError('Unmatched parentheses')
+            if want_value:
+                raise ValueError('Empty parentheses')
+            op, negated = frames.pop()
+            if negated:
+                code.append('neg')
+            if op is not None:
+                code.append(op)
+        else:
+            if not want_value:
+                raise ValueError('Missing operator')
+            if tok[0].isdigit() or tok[0] == '.':
+                code.append(-float(tok) if negate else float(tok))
+            elif tok[0].isalpha() or tok[0] == '_':
+                code.append(('load', tok))
+                if negate:
+                    code.append('neg')
+                if tok not in names:
+                    names.append(tok)
+            else:
+                raise ValueError(f'Unexpected character {tok!r}')
+            if op is not None:
+                code.append(op)
+            negate = False
+            want_value = False
+    if frames:
+        raise ValueError('Unmatched parentheses')
+    if want_value:
+        raise ValueError('Incomplete expression')
+    return tuple(code), tuple(names)
+
+
+class Template:
+    def __init__(self, template: str):
+        self.template = template
+        self.code, self.names = compile_template(template)
+
+    def __repr__(self):
+        return f'Template({self.template!r})'
+
+    def evaluate(self, use_numpy=None, **columns):
+        missing = [n for n in self.names if n not in columns]
+        if missing:
+            raise KeyError(f'Missing columns: {", ".join(missing)}')
+        if use_numpy is None:
+            use_numpy = np is not None
+        if use_numpy:
+            return self._evaluate_numpy(columns)
+        return self._evaluate_arrays(columns)
+
+    def _rows(self, columns):
+        lengths = {len(columns[n]) for n in self.names}
+        if len(lengths) > 1:
+            raise ValueError('Columns have different lengths')
+        return lengths.pop() if lengths else 1
+
+    def _evaluate_numpy(self, columns):
+        n = self._rows(columns)
+        cols = {name: np.asarray(columns[name], dtype=np.float64) for name in self.names}
+        mask = np.zeros(n, dtype=bool)
+        stack = []
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for step in self.code:
+                if step.__class__ is float:
+                    stack.append(step)
+                elif step.__class__ is tuple:
+                    stack.append(cols[step[1]])
+                elif step == 'neg':
+                    stack.append(-stack.pop())
+                else:
+                    b = stack.pop()
+                    a = stack.pop()
+                    if step == '/':
+                        zero = np.asarray(b) == 0
+                        if zero.any():
+                            mask |= zero
+                            stack.append(np.where(zero, np.nan, np.true_divide(a, b)))
+                            continue
+                    stack.append(OPS[step](a, b))
+        values = np.broadcast_to(np.asarray(stack.pop(), dtype=np.float64), (n,)).copy()
+        return values, mask
+
+    def _evaluate_arrays(self, columns):
+        n = self._rows(columns)
+        mask = array('b', bytes(n))
+        stack = []
+        for step in self.code:
+            if step.__class__ is float:
+                stack.append(array('d', [step]) * n)
+            elif step.__class__ is tuple:
+                col = columns[step[1]]
+                stack.append(col if isinstance(col, array) and col.typecode == 'd'
+                             else array('d', col))
+            elif step == 'neg':
+                stack.append(array('d', [-x for x in stack.pop()]))
+            else:
+                b = stack.pop()
+                a = stack.pop()
+                if step == '/':
+                    if 0.0 in b:
+                        for i, y in enumerate(b):
+                            if y == 0.0:
+                                mask[i] = 1
+                        stack.append(array('d', [x / y if y else math.nan
+                                                 for x, y in zip(a, b)]))
+                        continue
+                stack.append(array('d', map(OPS[step], a, b)))
+        return stack.pop(), mask
+
+
+@lru_cache(maxsize=256)
+def template(text: str) -> Template:
+    return Template(text)
+
+
+def evaluate_columns(text: str, use_numpy=None, **columns):
+    return template(text).evaluate(use_numpy=use_numpy, **columns)